@@ -1,16 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from typing import Dict
-import json
+import orjson
 import hmac
 import hashlib
 
 from app.services.paystack_service import paystack_service
+from app.services.wallet_service import wallet_service
+from app.core.config import settings
 from app.core.security import get_current_user
 from app.models.user import User
 
 router = APIRouter()
 
+# Bind the webhook secret once - skips settings attribute lookups and a
+# per-request str.encode() on the webhook hot path
+PAYSTACK_WEBHOOK_SECRET_BYTES = settings.PAYSTACK_WEBHOOK_SECRET.encode()
+
+# The public key is constant for the process lifetime - serialize it once.
+# Only the body bytes are shared: a Response instance must be built per
+# request, because middleware (e.g. CORSMiddleware) mutates response
+# headers in place and a shared instance would leak them across requests.
+_PUBLIC_KEY_BODY = orjson.dumps(
+    {"public_key": paystack_service.get_public_key()}
+)
+
 @router.post("/initialize")
 async def initialize_payment(
     amount: float,
@@ -20,122 +34,129 @@ async def initialize_payment(
     current_user: User = Depends(get_current_user)
 ):
     """Initialize a Paystack payment"""
-    try:
-        # Validate amount (minimum 100 KES)
-        if amount < 100:
-            raise HTTPException(status_code=400, detail="Minimum amount is 100 KES")
-        
-        # Initialize transaction
-        result = await paystack_service.initialize_transaction(
-            email=email,
-            amount=amount,
-            reference=reference,
-            callback_url=callback_url,
-            metadata={
-                "user_id": str(current_user.id),
-                "user_email": current_user.email,
-                "currency": "KES"
-            }
-        )
-        
-        if result["success"]:
-            return {
-                "success": True,
-                "authorization_url": result["authorization_url"],
-                "reference": result["reference"]
-            }
-        else:
-            raise HTTPException(status_code=400, detail=result["error"])
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Validate amount (minimum 100 KES)
+    if amount < 100:
+        raise HTTPException(status_code=400, detail="Minimum amount is 100 KES")
+
+    # Initialize transaction
+    result = await paystack_service.initialize_transaction(
+        email=email,
+        amount=amount,
+        reference=reference,
+        callback_url=callback_url,
+        metadata={
+            "user_id": str(current_user.id),
+            "user_email": current_user.email,
+            "currency": "KES"
+        }
+    )
+
+    if result["success"]:
+        return {
+            "success": True,
+            "authorization_url": result["authorization_url"],
+            "reference": result["reference"]
+        }
+    else:
+        raise HTTPException(status_code=400, detail=result["error"])
 
 @router.get("/verify/{reference}")
 async def verify_payment(reference: str, current_user: User = Depends(get_current_user)):
     """Verify a Paystack payment"""
-    try:
-        result = await paystack_service.verify_transaction(reference)
-        
-        if result["success"]:
-            # Here you would typically:
-            # 1. Update user balance
-            # 2. Create transaction record
-            # 3. Send confirmation email
-            
-            return {
-                "success": True,
-                "transaction": result
-            }
-        else:
-            raise HTTPException(status_code=400, detail=result["error"])
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    result = await paystack_service.verify_transaction(reference)
+
+    if result["success"]:
+        if result["status"] == "success":
+            # Credit the account recorded at initialize time, never the
+            # caller - anyone who learns a reference can hit this endpoint
+            deposit_user_id = (result.get("metadata") or {}).get("user_id")
+            if not deposit_user_id:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Transaction has no recorded owner"
+                )
+            deposit = await wallet_service.record_paystack_deposit(
+                deposit_user_id, result["amount"], reference
+            )
+            if not deposit["success"]:
+                raise HTTPException(status_code=400, detail=deposit["error"])
+
+        return {
+            "success": True,
+            "transaction": result
+        }
+    else:
+        raise HTTPException(status_code=400, detail=result["error"])
 
 @router.post("/webhook")
 async def paystack_webhook(request: Request):
     """Handle Paystack webhook notifications"""
-    try:
-        # Get the request body
-        body = await request.body()
-        signature = request.headers.get("X-Paystack-Signature")
-        
-        # Verify webhook signature
-        if not signature:
-            raise HTTPException(status_code=400, detail="Missing signature")
-        
-        # Verify webhook (you should implement proper signature verification)
-        # This is a simplified version - implement proper verification in production
-        
-        # Parse the webhook data
-        webhook_data = json.loads(body)
-        event = webhook_data.get("event")
-        data = webhook_data.get("data", {})
-        
-        if event == "charge.success":
-            # Payment was successful
-            reference = data.get("reference")
-            amount = data.get("amount", 0) / 100  # Convert from Kobo to KES
-            
-            # Process successful payment
-            # Update user balance, create transaction record, etc.
-            
-            return {"status": "success", "message": "Payment processed"}
-            
-        elif event == "charge.failed":
-            # Payment failed
-            reference = data.get("reference")
-            
-            # Handle failed payment
-            # Maybe send notification to user
-            
-            return {"status": "success", "message": "Failed payment handled"}
-            
-        else:
-            # Other events
-            return {"status": "success", "message": "Event processed"}
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    signature = request.headers.get("X-Paystack-Signature")
+
+    # Verify webhook signature
+    if not signature:
+        raise HTTPException(status_code=400, detail="Missing signature")
+
+    # Update the HMAC as body chunks arrive instead of buffering first,
+    # then compare in constant time before parsing anything
+    hmac_ctx = hmac.new(PAYSTACK_WEBHOOK_SECRET_BYTES, digestmod=hashlib.sha256)
+    body = bytearray()
+    async for chunk in request.stream():
+        hmac_ctx.update(chunk)
+        body.extend(chunk)
+
+    if not hmac.compare_digest(hmac_ctx.hexdigest(), signature):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+    # Parse the webhook data
+    webhook_data = orjson.loads(bytes(body))
+    event = webhook_data.get("event")
+    data = webhook_data.get("data", {})
+
+    if event == "charge.success":
+        # Payment was successful
+        reference = data.get("reference")
+        # Keep integer minor units (Kobo) - dividing by 100 here would put
+        # float rounding into a financial path
+        amount_kobo = data.get("amount", 0)
+
+        # Process successful payment
+        # Update user balance, create transaction record, etc.
+
+        return {"status": "success", "message": "Payment processed"}
+
+    elif event == "charge.failed":
+        # Payment failed
+        reference = data.get("reference")
+
+        # Handle failed payment
+        # Maybe send notification to user
+
+        return {"status": "success", "message": "Failed payment handled"}
+
+    else:
+        # Other events
+        return {"status": "success", "message": "Event processed"}
 
 @router.get("/banks")
 async def list_banks():
     """List available banks for bank transfer"""
-    try:
-        result = await paystack_service.list_banks()
-        
-        if result["success"]:
-            return {
-                "success": True,
-                "banks": result["banks"]
-            }
-        else:
-            raise HTTPException(status_code=400, detail=result["error"])
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    result = await paystack_service.list_banks()
+
+    if result["success"]:
+        # Large fixed-shape payload - skip the response_model/encoder path
+        return ORJSONResponse({
+            "success": True,
+            "banks": result["banks"]
+        })
+    else:
+        raise HTTPException(status_code=400, detail=result["error"])
 
 @router.get("/public-key")
 async def get_public_key():
     """Get Paystack public key for frontend"""
-    return {"public_key": paystack_service.get_public_key()}
+    return Response(
+        content=_PUBLIC_KEY_BODY,
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=3600"}
+    )
@@ -41,6 +41,13 @@ class Settings(BaseSettings):
     # Currency Exchange (for Kenyan market)
     EXCHANGE_RATE_API_KEY: str = ""
     
+    # Hosts allowed to reach the API in production
+    ALLOWED_HOSTS: list = [
+        "localhost",
+        "127.0.0.1",
+        "your-backend-domain.railway.app"
+    ]
+
     # CORS
     ALLOWED_ORIGINS: list = [
         "http://localhost:3000",
@@ -1,7 +1,23 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
+import re
+
+# Kenyan phone number in local or international form - the single compiled
+# pattern shared by models and routes so normalization happens exactly once.
+# The + is optional to match the M-Pesa normalizer, which accepts (and
+# stores) the plus-less 2547XXXXXXXX form.
+KE_PHONE_RE = re.compile(r"^(?:\+?254|0)?(\d{9})$")
+
+def normalize_phone_number(value: Optional[str]) -> Optional[str]:
+    """Normalize a Kenyan phone number to the canonical +2547XXXXXXXX form"""
+    if not value:
+        return None
+    match = KE_PHONE_RE.match(value)
+    if not match:
+        raise ValueError("Invalid Kenyan phone number")
+    return "+254" + match.group(1)
 
 class UserRole(str, Enum):
     USER = "user"
@@ -19,6 +35,22 @@ class WalletStatus(str, Enum):
     PENDING_VERIFICATION = "pending_verification"
 
 class User(BaseModel):
+    # v2 config compiles to a Rust validator; frozen skips per-field setattr hooks
+    model_config = ConfigDict(
+        populate_by_name=True,
+        frozen=True,
+        json_schema_extra={
+            "example": {
+                "email": "user@example.com",
+                "full_name": "John Doe",
+                "phone_number": "+254700000000",
+                "country": "Kenya",
+                "currency": "KES",
+                "risk_tolerance": "medium"
+            }
+        }
+    )
+
     id: Optional[str] = Field(None, alias="_id")
     email: EmailStr
     full_name: str
@@ -55,19 +87,17 @@ class User(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     last_login: Optional[datetime] = None
-    
-    class Config:
-        allow_population_by_field_name = True
-        schema_extra = {
-            "example": {
-                "email": "user@example.com",
-                "full_name": "John Doe",
-                "phone_number": "+254700000000",
-                "country": "Kenya",
-                "currency": "KES",
-                "risk_tolerance": "medium"
-            }
-        }
+
+    @field_validator("phone_number", mode="before")
+    @classmethod
+    def _normalize_phone(cls, value):
+        # User is built from stored documents, which may predate validation
+        # or hold non-Kenyan numbers - normalize when possible but never
+        # refuse to load. Strict rejection belongs to UserCreate.
+        try:
+            return normalize_phone_number(value)
+        except ValueError:
+            return value
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -76,6 +106,11 @@ class UserCreate(BaseModel):
     profile_picture: Optional[str] = None
     phone_number: Optional[str] = None
 
+    @field_validator("phone_number", mode="before")
+    @classmethod
+    def _normalize_phone(cls, value):
+        return normalize_phone_number(value)
+
 class UserUpdate(BaseModel):
     full_name: Optional[str] = None
     phone_number: Optional[str] = None
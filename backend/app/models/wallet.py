@@ -1,8 +1,10 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
 
+from app.models.user import normalize_phone_number
+
 class TransactionType(str, Enum):
     DEPOSIT = "deposit"
     WITHDRAWAL = "withdrawal"
@@ -24,9 +26,12 @@ class TransferType(str, Enum):
     AIRTEL_MONEY = "airtel_money"  # Airtel Money
 
 class Wallet(BaseModel):
+    model_config = ConfigDict(populate_by_name=True, frozen=True)
+
     id: Optional[str] = Field(None, alias="_id")
     user_id: str
     wallet_number: str  # Unique wallet number (e.g., TM0012345678)
+    phone_number: Optional[str] = None  # Denormalized from the user for P2P lookup
     balance_kes: float = 0.0
     balance_usdt: float = 0.0
     status: str = "active"
@@ -39,6 +44,8 @@ class Wallet(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 class WalletTransaction(BaseModel):
+    model_config = ConfigDict(populate_by_name=True, frozen=True)
+
     id: Optional[str] = Field(None, alias="_id")
     transaction_id: str  # Unique transaction ID
     wallet_id: str
@@ -81,6 +88,11 @@ class P2PTransfer(BaseModel):
     description: Optional[str] = None
     pin: str  # Wallet PIN for security
 
+    @field_validator("recipient_phone", mode="before")
+    @classmethod
+    def _normalize_phone(cls, value):
+        return normalize_phone_number(value)
+
 class BankTransfer(BaseModel):
     wallet_id: str
     bank_code: str
@@ -1,24 +1,58 @@
 import httpx
+import orjson
+import redis.asyncio as redis
+from cachetools import TTLCache
+from decimal import Decimal
 from typing import Dict, Optional
 from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Bank list changes on the order of weeks - cache it for a day
+BANKS_CACHE_KEY = "paystack:banks"
+BANKS_CACHE_TTL = 86400
+
+# Verification results in these states can never change again
+TERMINAL_TX_STATUSES = {"success", "failed", "abandoned"}
+
 class PaystackService:
     def __init__(self):
         self.secret_key = settings.PAYSTACK_SECRET_KEY
         self.public_key = settings.PAYSTACK_PUBLIC_KEY
         self.base_url = "https://api.paystack.co"
-        self.headers = {
-            "Authorization": f"Bearer {self.secret_key}",
-            "Content-Type": "application/json"
-        }
-    
+        # Shared client so keep-alive amortizes TCP/TLS handshakes across
+        # calls; HTTP/2 lets concurrent verifications multiplex a few sockets
+        # instead of opening one connection each. Headers live on the client
+        # so httpx encodes them to wire form once rather than per request.
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                "Authorization": f"Bearer {self.secret_key}",
+                "Content-Type": "application/json"
+            },
+            http2=True,
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            limits=httpx.Limits(
+                max_connections=20,
+                max_keepalive_connections=20,
+                keepalive_expiry=300
+            )
+        )
+        self._redis = redis.from_url(settings.REDIS_URL)
+        # Callback + user reload both verify the same reference; serve the
+        # duplicate from memory instead of re-hitting Paystack
+        self._verify_cache = TTLCache(maxsize=10_000, ttl=600)
+
+    async def aclose(self):
+        """Close the shared HTTP and Redis clients (call on app shutdown)"""
+        await self._client.aclose()
+        await self._redis.aclose()
+
     async def initialize_transaction(
-        self, 
-        email: str, 
-        amount: float, 
+        self,
+        email: str,
+        amount: float,
         reference: str,
         callback_url: str,
         metadata: Optional[Dict] = None
@@ -28,9 +62,10 @@ class PaystackService:
         Amount should be in KES (Kobo - multiply by 100)
         """
         try:
-            # Convert KES to Kobo (Paystack expects amount in smallest currency unit)
-            amount_kobo = int(amount * 100)
-            
+            # Convert KES to Kobo (Paystack expects amount in smallest currency
+            # unit) - go through Decimal so e.g. 100.07 doesn't truncate to 10006
+            amount_kobo = int(Decimal(str(amount)) * 100)
+
             payload = {
                 "email": email,
                 "amount": amount_kobo,
@@ -39,64 +74,73 @@ class PaystackService:
                 "currency": "NGN",  # Paystack uses NGN but we'll handle KES conversion
                 "metadata": metadata or {}
             }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/transaction/initialize",
-                    json=payload,
-                    headers=self.headers
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "success": True,
-                        "authorization_url": data["data"]["authorization_url"],
-                        "reference": data["data"]["reference"],
-                        "access_code": data["data"]["access_code"]
-                    }
-                else:
-                    logger.error(f"Paystack initialization failed: {response.text}")
-                    return {"success": False, "error": "Failed to initialize transaction"}
-                    
+
+            response = await self._client.post(
+                "/transaction/initialize",
+                json=payload
+            )
+
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "success": True,
+                    "authorization_url": data["data"]["authorization_url"],
+                    "reference": data["data"]["reference"],
+                    "access_code": data["data"]["access_code"]
+                }
+            else:
+                logger.error(f"Paystack initialization failed: {response.text}")
+                return {"success": False, "error": "Failed to initialize transaction"}
+
         except Exception as e:
             logger.error(f"Error initializing Paystack transaction: {str(e)}")
             return {"success": False, "error": str(e)}
-    
+
     async def verify_transaction(self, reference: str) -> Dict:
         """Verify a Paystack transaction"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/transaction/verify/{reference}",
-                    headers=self.headers
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    transaction_data = data["data"]
-                    
-                    return {
-                        "success": True,
-                        "status": transaction_data["status"],
-                        "amount": transaction_data["amount"] / 100,  # Convert from Kobo to KES
-                        "currency": transaction_data["currency"],
-                        "reference": transaction_data["reference"],
-                        "gateway_response": transaction_data["gateway_response"],
-                        "paid_at": transaction_data.get("paid_at"),
-                        "metadata": transaction_data.get("metadata", {})
-                    }
-                else:
-                    logger.error(f"Paystack verification failed: {response.text}")
-                    return {"success": False, "error": "Failed to verify transaction"}
-                    
+            cached = self._verify_cache.get(reference)
+            if cached is not None:
+                return cached
+
+            response = await self._client.get(f"/transaction/verify/{reference}")
+
+            if response.status_code == 200:
+                data = response.json()
+                transaction_data = data["data"]
+
+                # Keep the gateway's integer minor units; convert via Decimal
+                # only at the response boundary to avoid FP drift on money
+                amount_kobo = transaction_data["amount"]
+
+                result = {
+                    "success": True,
+                    "status": transaction_data["status"],
+                    "amount_kobo": amount_kobo,
+                    "amount": float(Decimal(amount_kobo) / 100),
+                    "currency": transaction_data["currency"],
+                    "reference": transaction_data["reference"],
+                    "gateway_response": transaction_data["gateway_response"],
+                    "paid_at": transaction_data.get("paid_at"),
+                    "metadata": transaction_data.get("metadata", {})
+                }
+
+                # Only memoize terminal states - pending must stay live
+                if result["status"] in TERMINAL_TX_STATUSES:
+                    self._verify_cache[reference] = result
+
+                return result
+            else:
+                logger.error(f"Paystack verification failed: {response.text}")
+                return {"success": False, "error": "Failed to verify transaction"}
+
         except Exception as e:
             logger.error(f"Error verifying Paystack transaction: {str(e)}")
             return {"success": False, "error": str(e)}
-    
+
     async def create_subscription(
-        self, 
-        customer_email: str, 
+        self,
+        customer_email: str,
         plan_code: str,
         start_date: Optional[str] = None
     ) -> Dict:
@@ -107,52 +151,64 @@ class PaystackService:
                 "plan": plan_code,
                 "start_date": start_date
             }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/subscription",
-                    json=payload,
-                    headers=self.headers
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return {
-                        "success": True,
-                        "subscription_code": data["data"]["subscription_code"],
-                        "status": data["data"]["status"]
-                    }
-                else:
-                    logger.error(f"Paystack subscription creation failed: {response.text}")
-                    return {"success": False, "error": "Failed to create subscription"}
-                    
+
+            response = await self._client.post(
+                "/subscription",
+                json=payload
+            )
+
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    "success": True,
+                    "subscription_code": data["data"]["subscription_code"],
+                    "status": data["data"]["status"]
+                }
+            else:
+                logger.error(f"Paystack subscription creation failed: {response.text}")
+                return {"success": False, "error": "Failed to create subscription"}
+
         except Exception as e:
             logger.error(f"Error creating Paystack subscription: {str(e)}")
             return {"success": False, "error": str(e)}
-    
+
     async def list_banks(self) -> Dict:
         """List available banks for bank transfer"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/bank",
-                    headers=self.headers
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
+            # Serve from Redis when possible to skip the Paystack round trip
+            try:
+                cached = await self._redis.get(BANKS_CACHE_KEY)
+                if cached:
                     return {
                         "success": True,
-                        "banks": data["data"]
+                        "banks": orjson.loads(cached)
                     }
-                else:
-                    logger.error(f"Failed to fetch banks: {response.text}")
-                    return {"success": False, "error": "Failed to fetch banks"}
-                    
+            except Exception as e:
+                logger.warning(f"Bank list cache unavailable: {str(e)}")
+
+            response = await self._client.get("/bank")
+
+            if response.status_code == 200:
+                data = response.json()
+                banks = data["data"]
+                try:
+                    await self._redis.set(
+                        BANKS_CACHE_KEY, orjson.dumps(banks), ex=BANKS_CACHE_TTL
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to cache bank list: {str(e)}")
+                return {
+                    "success": True,
+                    "banks": banks
+                }
+            else:
+                logger.error(f"Failed to fetch banks: {response.text}")
+                return {"success": False, "error": "Failed to fetch banks"}
+
         except Exception as e:
             logger.error(f"Error fetching banks: {str(e)}")
             return {"success": False, "error": str(e)}
-    
+
     def get_public_key(self) -> str:
         """Get Paystack public key for frontend"""
         return self.public_key
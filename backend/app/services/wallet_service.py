@@ -1,68 +1,258 @@
+import asyncio
+import hmac
+import secrets
+import time
 import uuid
 import hashlib
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from cachetools import TTLCache
 from app.models.wallet import (
     Wallet, WalletTransaction, P2PTransfer, BankTransfer,
     TransactionType, TransactionStatus, TransferType
 )
+from functools import cached_property, lru_cache
+import redis.asyncio as redis
+from app.core.config import settings
 from app.core.database import get_database
-from app.services.paystack_service import paystack_service
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Tuned so a single hash costs ~50 ms on the target CPU - slow enough to
+# resist brute force on a 4-digit PIN, fast enough for the request budget
+_pin_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=2)
+
+# Wallets are re-read several times within a single request flow (balance,
+# limits, PIN check) - a few seconds of staleness is acceptable there, and
+# every mutation path below invalidates eagerly anyway
+WALLET_CACHE_TTL = 5
+
+# Fee rates and transfer caps, in one tweakable place
+FEE_P2P_RATE = 0.005  # 0.5%
+FEE_BANK_RATE = 0.01  # 1%
+DAILY_TRANSFER_CAP = 10  # Max transfers per day
+
+# Enum members hoisted out of the hot constructors - each inline
+# TransactionType.X access goes through EnumMeta's __getattr__
+_TT_TRANSFER = TransactionType.TRANSFER
+_TT_DEPOSIT = TransactionType.DEPOSIT
+_TS_PENDING = TransactionStatus.PENDING
+_TS_COMPLETED = TransactionStatus.COMPLETED
+_TF_P2P = TransferType.P2P
+_TF_BANK = TransferType.BANK
+
+# Daily transfer limits live in Redis: INCR on a midnight-expiring key is
+# far cheaper than $inc-ing a contended field on the wallet document, and
+# the script rolls its own increments back when a limit trips.
+# Returns 0 = allowed, 1 = count cap hit, 2 = amount cap hit.
+_DAILY_LIMIT_LUA = """
+local count = redis.call('INCR', KEYS[1])
+local total = tonumber(redis.call('INCRBYFLOAT', KEYS[2], ARGV[2]))
+redis.call('EXPIREAT', KEYS[1], ARGV[1])
+redis.call('EXPIREAT', KEYS[2], ARGV[1])
+if count > tonumber(ARGV[3]) then
+    redis.call('DECR', KEYS[1])
+    redis.call('INCRBYFLOAT', KEYS[2], '-' .. ARGV[2])
+    return 1
+end
+if total > tonumber(ARGV[4]) then
+    redis.call('DECR', KEYS[1])
+    redis.call('INCRBYFLOAT', KEYS[2], '-' .. ARGV[2])
+    return 2
+end
+return 0
+"""
+
 class WalletService:
     def __init__(self):
-        self.db = get_database()
-        self.wallets_collection = self.db.wallets
-        self.transactions_collection = self.db.wallet_transactions
-        self.users_collection = self.db.users
-    
+        # In-process cache keyed by user_id; repeat reads inside the TTL
+        # cost a dict lookup instead of a Mongo round trip
+        self._wallet_cache = TTLCache(maxsize=10_000, ttl=WALLET_CACHE_TTL)
+
+    # Collection handles resolve lazily on first use instead of at import
+    # time, so constructing the service (and booting a worker) never blocks
+    # on the database
+    @cached_property
+    def db(self):
+        return get_database()
+
+    @cached_property
+    def wallets_collection(self):
+        return self.db.wallets
+
+    @cached_property
+    def transactions_collection(self):
+        return self.db.wallet_transactions
+
+    @cached_property
+    def users_collection(self):
+        return self.db.users
+
+    @cached_property
+    def _redis(self):
+        return redis.from_url(settings.REDIS_URL)
+
+    @cached_property
+    def _daily_limit_script(self):
+        return self._redis.register_script(_DAILY_LIMIT_LUA)
+
+    async def _reserve_daily_limit(self, wallet_id: str, amount: float,
+                                   daily_limit_kes: float) -> Optional[str]:
+        """Atomically reserve daily-limit headroom; returns an error string
+        if a cap is exceeded, None when the transfer may proceed"""
+        # Both keys expire at the next UTC midnight
+        expire_at = int(time.time()) // 86400 * 86400 + 86400
+        try:
+            verdict = await self._daily_limit_script(
+                keys=[
+                    f"wallet:{wallet_id}:daily_count",
+                    f"wallet:{wallet_id}:daily_amount"
+                ],
+                args=[expire_at, amount, DAILY_TRANSFER_CAP, daily_limit_kes]
+            )
+        except Exception as e:
+            # Fail open: the balance predicate still protects the money,
+            # only the rate limit is briefly unenforced
+            logger.warning(f"Daily limit check unavailable: {str(e)}")
+            return None
+        if verdict == 1:
+            return "Daily transfer limit reached"
+        if verdict == 2:
+            return "Daily amount limit exceeded"
+        return None
+
+    async def _release_daily_limit(self, wallet_id: str, amount: float) -> None:
+        """Hand back a daily-limit reservation after a failed debit"""
+        try:
+            await asyncio.gather(
+                self._redis.decr(f"wallet:{wallet_id}:daily_count"),
+                self._redis.incrbyfloat(f"wallet:{wallet_id}:daily_amount", -amount)
+            )
+        except Exception as e:
+            logger.warning(f"Daily limit release failed: {str(e)}")
+
+    def _invalidate_wallet_cache(self, user_id: str) -> None:
+        """Drop a user's cached wallet after any balance/PIN mutation"""
+        self._wallet_cache.pop(user_id, None)
+
+    async def ensure_indexes(self) -> None:
+        """Create the indexes every hot query path relies on (idempotent)"""
+        # Without these Mongo collection-scans on each find_one; create_index
+        # is a no-op when the index already exists, so this is safe at startup
+        await asyncio.gather(
+            self.wallets_collection.create_index("user_id", unique=True),
+            self.wallets_collection.create_index("wallet_number", unique=True),
+            # Partial, not sparse: sparse only skips missing fields, and a
+            # stored phone_number: null would be indexed - the second
+            # null-phone wallet would then die with DuplicateKeyError
+            self.wallets_collection.create_index(
+                "phone_number", unique=True,
+                partialFilterExpression={"phone_number": {"$type": "string"}}
+            ),
+            self.transactions_collection.create_index(
+                [("user_id", 1), ("created_at", -1)]
+            ),
+            self.transactions_collection.create_index("transaction_id"),
+            # Gateway references must be unique so a replayed verify can't
+            # record (and credit) the same deposit twice; partial because
+            # internal transfers carry reference: None
+            self.transactions_collection.create_index(
+                "reference", unique=True,
+                partialFilterExpression={"reference": {"$type": "string"}}
+            ),
+            self.users_collection.create_index("email", unique=True),
+            self.users_collection.create_index("phone_number")
+        )
+
     def _generate_wallet_number(self) -> str:
         """Generate unique wallet number"""
-        timestamp = str(int(datetime.utcnow().timestamp()))[-8:]
-        random_suffix = str(uuid.uuid4().hex)[:6].upper()
-        return f"TM{timestamp}{random_suffix}"
-    
-    def _hash_pin(self, pin: str) -> str:
-        """Hash wallet PIN for security"""
-        return hashlib.sha256(pin.encode()).hexdigest()
+        # secrets.token_hex reads the same OS CSPRNG as uuid4 without the
+        # UUID object construction and formatting overhead
+        return f"TM{int(time.time()) % 10**8:08d}{secrets.token_hex(3).upper()}"
     
-    def _verify_pin(self, pin: str, hashed_pin: str) -> bool:
+    async def _hash_pin(self, pin: str) -> str:
+        """Hash wallet PIN with Argon2, off the event loop"""
+        # Argon2 deliberately burns ~50 ms - run it in the default executor so
+        # the event loop keeps servicing other requests
+        return await asyncio.get_running_loop().run_in_executor(
+            None, _pin_hasher.hash, pin
+        )
+
+    async def _verify_pin(self, pin: str, hashed_pin: str) -> bool:
         """Verify wallet PIN"""
-        return self._hash_pin(pin) == hashed_pin
+        if hashed_pin.startswith("$argon2"):
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    None, _pin_hasher.verify, hashed_pin, pin
+                )
+            except VerifyMismatchError:
+                return False
+        # Legacy PINs were stored as unsalted SHA-256; compare in constant
+        # time so the check leaks no timing signal about matching prefixes
+        return hmac.compare_digest(
+            hashlib.sha256(pin.encode()).hexdigest(), hashed_pin
+        )
     
     async def create_wallet(self, user_id: str) -> Dict:
         """Create a new wallet for user"""
         try:
-            # Check if wallet already exists
-            existing_wallet = await self.wallets_collection.find_one({"user_id": user_id})
-            if existing_wallet:
-                return {"success": False, "error": "Wallet already exists"}
-            
+            # Denormalize the user's phone onto the wallet at birth - P2P
+            # recipient lookup resolves by wallet.phone_number, so without
+            # this copy every wallet created here is unreachable
+            user_doc = await self.users_collection.find_one(
+                {"_id": user_id}, {"phone_number": 1}
+            )
             wallet_data = Wallet(
                 user_id=user_id,
-                wallet_number=self._generate_wallet_number()
+                wallet_number=self._generate_wallet_number(),
+                phone_number=(user_doc or {}).get("phone_number")
             )
-            
-            # Insert wallet
-            result = await self.wallets_collection.insert_one(wallet_data.dict())
-            
-            # Update user with wallet info
-            await self.users_collection.update_one(
-                {"_id": user_id},
-                {
-                    "$set": {
-                        "wallet_id": str(result.inserted_id),
-                        "wallet_status": "active"
+
+            # Generate the _id client-side so the user update doesn't have to
+            # wait for the insert ack to learn it - both writes go out
+            # concurrently. The upsert still makes check + insert atomic.
+            # exclude_none keeps phone_number: null (and the unset id alias)
+            # out of the document so the partial phone index never sees it.
+            wallet_id = ObjectId()
+            wallet_doc = wallet_data.model_dump(exclude_none=True)
+            wallet_doc["_id"] = wallet_id
+
+            upsert_result, _ = await asyncio.gather(
+                self.wallets_collection.update_one(
+                    {"user_id": user_id},
+                    {"$setOnInsert": wallet_doc},
+                    upsert=True
+                ),
+                self.users_collection.update_one(
+                    {"_id": user_id},
+                    {
+                        "$set": {
+                            "wallet_id": str(wallet_id),
+                            "wallet_status": "active"
+                        }
                     }
-                }
+                )
             )
-            
+            if upsert_result.upserted_id is None:
+                # Lost a create race - repoint the user at the wallet that won
+                existing = await self.wallets_collection.find_one(
+                    {"user_id": user_id}, {"_id": 1}
+                )
+                await self.users_collection.update_one(
+                    {"_id": user_id},
+                    {"$set": {"wallet_id": str(existing["_id"])}}
+                )
+                return {"success": False, "error": "Wallet already exists"}
+
             return {
                 "success": True,
-                "wallet_id": str(result.inserted_id),
+                "wallet_id": str(wallet_id),
                 "wallet_number": wallet_data.wallet_number
             }
             
@@ -73,14 +263,41 @@ class WalletService:
     async def get_wallet(self, user_id: str) -> Optional[Wallet]:
         """Get user's wallet"""
         try:
+            cached = self._wallet_cache.get(user_id)
+            if cached is not None:
+                return cached
             wallet_data = await self.wallets_collection.find_one({"user_id": user_id})
             if wallet_data:
-                return Wallet(**wallet_data)
+                wallet = Wallet(**wallet_data)
+                self._wallet_cache[user_id] = wallet
+                return wallet
             return None
         except Exception as e:
             logger.error(f"Error getting wallet: {str(e)}")
             return None
     
+    async def get_wallet_lite(self, user_id: str) -> Optional[Dict]:
+        """Get the raw wallet fields used on internal hot paths
+
+        Skips the Pydantic model build and projects only the fields the
+        transfer/PIN paths read, so Mongo ships and the driver decodes a
+        fraction of the document. Reads straight from Mongo (no cache) -
+        money paths want the freshest balance available.
+        """
+        try:
+            return await self.wallets_collection.find_one(
+                {"user_id": user_id},
+                {
+                    "balance_kes": 1,
+                    "wallet_pin": 1,
+                    "daily_limit_kes": 1,
+                    "wallet_number": 1
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error getting wallet: {str(e)}")
+            return None
+
     async def get_wallet_by_number(self, wallet_number: str) -> Optional[Wallet]:
         """Get wallet by wallet number"""
         try:
@@ -95,114 +312,137 @@ class WalletService:
     async def p2p_transfer(self, transfer_data: P2PTransfer, sender_user_id: str) -> Dict:
         """Process P2P transfer between users"""
         try:
-            # Get sender wallet
-            sender_wallet = await self.get_wallet(sender_user_id)
+            # Get sender wallet (projected fields only - this path never
+            # serializes the wallet back to the client)
+            sender_wallet = await self.get_wallet_lite(sender_user_id)
             if not sender_wallet:
                 return {"success": False, "error": "Sender wallet not found"}
-            
+
             # Verify PIN
-            if not self._verify_pin(transfer_data.pin, sender_wallet.wallet_pin or ""):
+            if not await self._verify_pin(transfer_data.pin, sender_wallet.get("wallet_pin") or ""):
                 return {"success": False, "error": "Invalid PIN"}
-            
-            # Check balance
-            if sender_wallet.balance_kes < transfer_data.amount:
-                return {"success": False, "error": "Insufficient balance"}
-            
-            # Check daily limits
-            if sender_wallet.daily_transfer_count >= 10:  # Max 10 transfers per day
-                return {"success": False, "error": "Daily transfer limit reached"}
-            
-            if sender_wallet.daily_transfer_count * transfer_data.amount > sender_wallet.daily_limit_kes:
-                return {"success": False, "error": "Daily amount limit exceeded"}
-            
-            # Find recipient by phone number
-            recipient_user = await self.users_collection.find_one({"phone_number": transfer_data.recipient_phone})
-            if not recipient_user:
-                return {"success": False, "error": "Recipient not found"}
-            
-            recipient_wallet = await self.get_wallet(recipient_user["_id"])
+
+            # The recipient phone is denormalized onto the wallet document,
+            # so a single keyed find resolves the whole recipient side - no
+            # users-collection hop at all. Resolved BEFORE the daily-limit
+            # reservation so a typo'd phone number can't consume headroom.
+            recipient_wallet = await self.wallets_collection.find_one(
+                {"phone_number": transfer_data.recipient_phone},
+                {"balance_kes": 1, "user_id": 1}
+            )
             if not recipient_wallet:
-                return {"success": False, "error": "Recipient wallet not found"}
-            
-            # Calculate fee (0.5% for P2P transfers)
-            fee = transfer_data.amount * 0.005
-            total_amount = transfer_data.amount + fee
-            
-            # Create transaction record
+                return {"success": False, "error": "Recipient not found"}
+
+            # Reserve daily-limit headroom in Redis (atomic Lua, no Mongo
+            # write-lock contention on the wallet document)
+            limit_error = await self._reserve_daily_limit(
+                str(sender_wallet["_id"]),
+                transfer_data.amount,
+                sender_wallet["daily_limit_kes"]
+            )
+            if limit_error:
+                return {"success": False, "error": limit_error}
+
+            # Calculate fee (0.5% for P2P transfers) in integer cents -
+            # float drift here would be $inc'ed into the stored ledger
+            amount_cents = round(transfer_data.amount * 100)
+            fee_cents = round(amount_cents * FEE_P2P_RATE)
+            fee = fee_cents / 100
+            total_amount = (amount_cents + fee_cents) / 100
+
+            # Conditional debit: the balance check travels in the query
+            # predicate, so check and decrement are one atomic operation -
+            # two concurrent transfers can no longer both pass a stale read
+            # and overdraw the wallet. The daily counters live in Redis now,
+            # so the wallet document update touches a single field.
+            # Any failure between the reservation and a successful debit
+            # must hand the reservation back, or the headroom leaks until
+            # midnight.
+            try:
+                debited = await self.wallets_collection.find_one_and_update(
+                    {
+                        "_id": sender_wallet["_id"],
+                        "balance_kes": {"$gte": total_amount}
+                    },
+                    {"$inc": {"balance_kes": -total_amount}},
+                    return_document=ReturnDocument.BEFORE
+                )
+            except Exception:
+                await self._release_daily_limit(
+                    str(sender_wallet["_id"]), transfer_data.amount
+                )
+                raise
+            if debited is None:
+                await self._release_daily_limit(
+                    str(sender_wallet["_id"]), transfer_data.amount
+                )
+                return {"success": False, "error": "Insufficient balance"}
+            self._invalidate_wallet_cache(sender_user_id)
+
+            # One timestamp shared by both records, so the pair of a transfer
+            # carries identical created/completed times
+            now = datetime.utcnow()
+
+            # Transaction records are born COMPLETED - the debit above already
+            # happened and the credit lands in the same batch below
             transaction = WalletTransaction(
                 transaction_id=str(uuid.uuid4()),
-                wallet_id=str(sender_wallet.id),
+                wallet_id=str(sender_wallet["_id"]),
                 user_id=sender_user_id,
-                transaction_type=TransactionType.TRANSFER,
-                transfer_type=TransferType.P2P,
+                transaction_type=_TT_TRANSFER,
+                transfer_type=_TF_P2P,
                 amount=transfer_data.amount,
                 currency=transfer_data.currency,
                 fee=fee,
                 total_amount=total_amount,
-                balance_before=sender_wallet.balance_kes,
-                balance_after=sender_wallet.balance_kes - total_amount,
-                status=TransactionStatus.PENDING,
+                balance_before=debited["balance_kes"],
+                balance_after=debited["balance_kes"] - total_amount,
+                status=_TS_COMPLETED,
+                created_at=now,
+                updated_at=now,
+                completed_at=now,
                 description=transfer_data.description,
-                recipient_wallet_id=str(recipient_wallet.id),
-                recipient_user_id=str(recipient_user["_id"]),
+                recipient_wallet_id=str(recipient_wallet["_id"]),
+                recipient_user_id=str(recipient_wallet["user_id"]),
                 recipient_phone=transfer_data.recipient_phone
             )
-            
-            # Insert transaction
-            await self.transactions_collection.insert_one(transaction.dict())
-            
-            # Update sender wallet
-            await self.wallets_collection.update_one(
-                {"_id": sender_wallet.id},
-                {
-                    "$inc": {
-                        "balance_kes": -total_amount,
-                        "daily_transfer_count": 1
-                    }
-                }
-            )
-            
-            # Update recipient wallet
-            await self.wallets_collection.update_one(
-                {"_id": recipient_wallet.id},
-                {
-                    "$inc": {"balance_kes": transfer_data.amount}
-                }
-            )
-            
+
             # Create recipient transaction record
             recipient_transaction = WalletTransaction(
                 transaction_id=str(uuid.uuid4()),
-                wallet_id=str(recipient_wallet.id),
-                user_id=str(recipient_user["_id"]),
-                transaction_type=TransactionType.DEPOSIT,
-                transfer_type=TransferType.P2P,
+                wallet_id=str(recipient_wallet["_id"]),
+                user_id=str(recipient_wallet["user_id"]),
+                transaction_type=_TT_DEPOSIT,
+                transfer_type=_TF_P2P,
                 amount=transfer_data.amount,
                 currency=transfer_data.currency,
                 fee=0.0,
                 total_amount=transfer_data.amount,
-                balance_before=recipient_wallet.balance_kes,
-                balance_after=recipient_wallet.balance_kes + transfer_data.amount,
-                status=TransactionStatus.COMPLETED,
-                description=f"Received from {sender_wallet.wallet_number}",
-                recipient_wallet_id=str(sender_wallet.id),
+                balance_before=recipient_wallet["balance_kes"],
+                balance_after=recipient_wallet["balance_kes"] + transfer_data.amount,
+                status=_TS_COMPLETED,
+                created_at=now,
+                updated_at=now,
+                completed_at=now,
+                description=f"Received from {sender_wallet['wallet_number']}",
+                recipient_wallet_id=str(sender_wallet["_id"]),
                 recipient_user_id=sender_user_id,
                 recipient_phone=transfer_data.recipient_phone
             )
-            
-            await self.transactions_collection.insert_one(recipient_transaction.dict())
-            
-            # Update transaction status to completed
-            await self.transactions_collection.update_one(
-                {"transaction_id": transaction.transaction_id},
-                {
-                    "$set": {
-                        "status": TransactionStatus.COMPLETED,
-                        "completed_at": datetime.utcnow()
-                    }
-                }
+
+            # The sender side is already settled by the conditional debit;
+            # record both transactions and credit the recipient concurrently
+            await asyncio.gather(
+                self.transactions_collection.insert_many(
+                    [transaction.model_dump(), recipient_transaction.model_dump()]
+                ),
+                self.wallets_collection.update_one(
+                    {"_id": recipient_wallet["_id"]},
+                    {"$inc": {"balance_kes": transfer_data.amount}}
+                )
             )
-            
+            self._invalidate_wallet_cache(str(recipient_wallet["user_id"]))
+
             return {
                 "success": True,
                 "transaction_id": transaction.transaction_id,
@@ -219,37 +459,47 @@ class WalletService:
     async def bank_transfer(self, transfer_data: BankTransfer, user_id: str) -> Dict:
         """Process bank transfer"""
         try:
-            # Get user wallet
-            wallet = await self.get_wallet(user_id)
+            # Get user wallet (projected fields only)
+            wallet = await self.get_wallet_lite(user_id)
             if not wallet:
                 return {"success": False, "error": "Wallet not found"}
-            
+
             # Verify PIN
-            if not self._verify_pin(transfer_data.pin, wallet.wallet_pin or ""):
+            if not await self._verify_pin(transfer_data.pin, wallet.get("wallet_pin") or ""):
                 return {"success": False, "error": "Invalid PIN"}
-            
-            # Check balance
-            if wallet.balance_kes < transfer_data.amount:
+
+            # Calculate fee (1% for bank transfers) - integer-cent
+            # arithmetic, same reasoning as p2p_transfer
+            amount_cents = round(transfer_data.amount * 100)
+            fee_cents = round(amount_cents * FEE_BANK_RATE)
+            fee = fee_cents / 100
+            total_amount = (amount_cents + fee_cents) / 100
+
+            # Same predicate-write pattern as p2p_transfer: balance check and
+            # debit as one atomic operation
+            debited = await self.wallets_collection.find_one_and_update(
+                {"_id": wallet["_id"], "balance_kes": {"$gte": total_amount}},
+                {"$inc": {"balance_kes": -total_amount}},
+                return_document=ReturnDocument.BEFORE
+            )
+            if debited is None:
                 return {"success": False, "error": "Insufficient balance"}
-            
-            # Calculate fee (1% for bank transfers)
-            fee = transfer_data.amount * 0.01
-            total_amount = transfer_data.amount + fee
-            
+            self._invalidate_wallet_cache(user_id)
+
             # Create transaction record
             transaction = WalletTransaction(
                 transaction_id=str(uuid.uuid4()),
-                wallet_id=str(wallet.id),
+                wallet_id=str(wallet["_id"]),
                 user_id=user_id,
-                transaction_type=TransactionType.TRANSFER,
-                transfer_type=TransferType.BANK,
+                transaction_type=_TT_TRANSFER,
+                transfer_type=_TF_BANK,
                 amount=transfer_data.amount,
                 currency=transfer_data.currency,
                 fee=fee,
                 total_amount=total_amount,
-                balance_before=wallet.balance_kes,
-                balance_after=wallet.balance_kes - total_amount,
-                status=TransactionStatus.PENDING,
+                balance_before=debited["balance_kes"],
+                balance_after=debited["balance_kes"] - total_amount,
+                status=_TS_PENDING,
                 description=transfer_data.description,
                 bank_code=transfer_data.bank_code,
                 bank_name=transfer_data.bank_name,
@@ -257,14 +507,8 @@ class WalletService:
                 account_name=transfer_data.account_name
             )
             
-            # Insert transaction
-            await self.transactions_collection.insert_one(transaction.dict())
-            
-            # Update wallet balance
-            await self.wallets_collection.update_one(
-                {"_id": wallet.id},
-                {"$inc": {"balance_kes": -total_amount}}
-            )
+            # The wallet is already debited above; just record the transaction
+            await self.transactions_collection.insert_one(transaction.model_dump())
             
             # Here you would integrate with Paystack for bank transfer
             # For now, we'll mark it as pending and process it asynchronously
@@ -282,18 +526,87 @@ class WalletService:
             logger.error(f"Error processing bank transfer: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    async def record_paystack_deposit(self, user_id: str, amount: float, reference: str) -> Dict:
+        """Credit a verified Paystack deposit and record the transaction
+
+        Idempotent: the unique partial index on ``reference`` makes the
+        transaction insert the claim, so a replayed verify of the same
+        reference can never credit the wallet a second time.
+        """
+        try:
+            # Fresh read off the money path - no cache between the balance
+            # snapshot and the credit
+            wallet = await self.get_wallet_lite(user_id)
+            if not wallet:
+                return {"success": False, "error": "Wallet not found"}
+
+            transaction = WalletTransaction(
+                transaction_id=str(uuid.uuid4()),
+                wallet_id=str(wallet["_id"]),
+                user_id=user_id,
+                transaction_type=_TT_DEPOSIT,
+                amount=amount,
+                currency="KES",
+                fee=0.0,
+                total_amount=amount,
+                balance_before=wallet["balance_kes"],
+                balance_after=wallet["balance_kes"] + amount,
+                status=_TS_COMPLETED,
+                reference=reference,
+                description="Paystack deposit"
+            )
+
+            # The insert must win before the balance moves: a duplicate
+            # reference means this deposit was already credited
+            try:
+                await self.transactions_collection.insert_one(
+                    transaction.model_dump()
+                )
+            except DuplicateKeyError:
+                return {
+                    "success": True,
+                    "amount": amount,
+                    "reference": reference,
+                    "duplicate": True
+                }
+
+            await self.wallets_collection.update_one(
+                {"_id": wallet["_id"]},
+                {"$inc": {"balance_kes": amount}}
+            )
+            self._invalidate_wallet_cache(user_id)
+
+            return {"success": True, "amount": amount, "reference": reference}
+
+        except Exception as e:
+            logger.error(f"Error recording Paystack deposit: {str(e)}")
+            return {"success": False, "error": str(e)}
+
     async def get_transaction_history(self, user_id: str, limit: int = 50) -> List[Dict]:
         """Get user's transaction history"""
         try:
+            # Project to the response shape and pull the whole page in one
+            # batch - to_list with batch_size(limit) is a single round trip,
+            # where async-for awaits the driver once per document batch
             cursor = self.transactions_collection.find(
-                {"user_id": user_id}
-            ).sort("created_at", -1).limit(limit)
-            
-            transactions = []
-            async for doc in cursor:
-                transactions.append(doc)
-            
-            return transactions
+                {"user_id": user_id},
+                {
+                    "transaction_id": 1,
+                    "transaction_type": 1,
+                    "transfer_type": 1,
+                    "amount": 1,
+                    "currency": 1,
+                    "fee": 1,
+                    "total_amount": 1,
+                    "status": 1,
+                    "description": 1,
+                    "recipient_phone": 1,
+                    "created_at": 1,
+                    "completed_at": 1
+                }
+            ).sort("created_at", -1).limit(limit).batch_size(limit)
+
+            return await cursor.to_list(length=limit)
             
         except Exception as e:
             logger.error(f"Error getting transaction history: {str(e)}")
@@ -302,22 +615,29 @@ class WalletService:
     async def set_wallet_pin(self, user_id: str, pin: str) -> Dict:
         """Set or update wallet PIN"""
         try:
-            wallet = await self.get_wallet(user_id)
-            if not wallet:
-                return {"success": False, "error": "Wallet not found"}
-            
-            hashed_pin = self._hash_pin(pin)
-            
-            await self.wallets_collection.update_one(
-                {"_id": wallet.id},
+            hashed_pin = await self._hash_pin(pin)
+
+            # Key directly on user_id - matched_count doubles as the
+            # existence check, so no preceding wallet read is needed
+            result = await self.wallets_collection.update_one(
+                {"user_id": user_id},
                 {"$set": {"wallet_pin": hashed_pin}}
             )
-            
+            if result.matched_count == 0:
+                return {"success": False, "error": "Wallet not found"}
+            self._invalidate_wallet_cache(user_id)
+
             return {"success": True, "message": "PIN set successfully"}
             
         except Exception as e:
             logger.error(f"Error setting wallet PIN: {str(e)}")
             return {"success": False, "error": str(e)}
 
-# Create service instance
-wallet_service = WalletService()
+@lru_cache
+def get_wallet_service() -> WalletService:
+    """Process-wide WalletService instance, created on first use."""
+    return WalletService()
+
+# Kept for callers importing the instance directly; resolves immediately but
+# no longer touches the database until a collection is first used
+wallet_service = get_wallet_service()
@@ -6,14 +6,17 @@ from datetime import datetime
 from bson import ObjectId
 
 from models.user import (
-    User, UserCreate, UserResponse, UserUpdate, UserLogin, 
-    UserLoginResponse, PhoneVerificationRequest, WalletPinRequest
+    User, UserCreate, UserResponse, UserUpdate, UserLogin,
+    UserLoginResponse, PhoneVerificationRequest, WalletPinRequest,
+    USER_RESPONSE_PROJECTION
 )
 from auth.jwt_handler import (
-    create_user_token, create_refresh_token, 
-    get_current_user, get_current_active_user
+    create_user_token, create_refresh_token,
+    get_current_user, get_current_active_user,
+    invalidate_user_cache
 )
-from database.mongodb import get_collection, USERS_COLLECTION
+from auth.google_oauth import _user_response_from_doc
+from database.mongodb import get_collection, USERS_COLLECTION, WALLETS_COLLECTION
 from config.settings import get_settings
 
 logger = logging.getLogger(__name__)
@@ -21,20 +24,26 @@ settings = get_settings()
 
 router = APIRouter()
 
+# Resolved once on first use - get_collection re-checks the connection and
+# builds a fresh collection handle on every call otherwise
+_users_collection = None
+
+async def get_users_collection():
+    """Dependency returning the memoized users collection handle."""
+    global _users_collection
+    if _users_collection is None:
+        _users_collection = await get_collection(USERS_COLLECTION)
+    return _users_collection
+
 @router.post("/register", response_model=UserResponse)
 async def register_user(user_data: UserCreate):
     """Register a new user."""
     try:
-        users_collection = await get_collection(USERS_COLLECTION)
-        
-        # Check if user already exists
-        existing_user = await users_collection.find_one({"email": user_data.email})
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User with this email already exists"
-            )
-        
+        users_collection = await get_users_collection()
+        # One timestamp for the whole request - created_at == updated_at
+        # exactly, and no repeated utcnow() syscalls
+        now = datetime.utcnow()
+
         # Create new user
         new_user = {
             "_id": ObjectId(),
@@ -49,18 +58,26 @@ async def register_user(user_data: UserCreate):
             "wallet_balance_usdt": 0.0,
             "is_phone_verified": False,
             "is_email_verified": False,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "created_at": now,
+            "updated_at": now
         }
         
-        # Insert user
-        result = await users_collection.insert_one(new_user)
-        
-        # Convert to response model
-        new_user["id"] = str(new_user["_id"])
-        del new_user["_id"]
-        
-        return UserResponse(**new_user)
+        # Existence check and insert fused into one upsert - a single round
+        # trip, and concurrent signups for the same email can't both pass a
+        # separate find_one check
+        result = await users_collection.update_one(
+            {"email": user_data.email},
+            {"$setOnInsert": new_user},
+            upsert=True
+        )
+        if result.upserted_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="User with this email already exists"
+            )
+
+        # Built from our own doc - skip the in-route validation pass
+        return _user_response_from_doc(new_user)
         
     except HTTPException:
         raise
@@ -75,10 +92,11 @@ async def register_user(user_data: UserCreate):
 async def login_user(login_data: UserLogin):
     """Login user with email and password."""
     try:
-        users_collection = await get_collection(USERS_COLLECTION)
-        
+        users_collection = await get_users_collection()
         # Find user by email
-        user_data = await users_collection.find_one({"email": login_data.email})
+        user_data = await users_collection.find_one(
+            {"email": login_data.email}, USER_RESPONSE_PROJECTION
+        )
         if not user_data:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -92,10 +110,7 @@ async def login_user(login_data: UserLogin):
         access_token = create_user_token(str(user_data["_id"]), user_data["email"])
         refresh_token = create_refresh_token(str(user_data["_id"]))
         
-        # Convert to response model
-        user_data["id"] = str(user_data["_id"])
-        del user_data["_id"]
-        user_response = UserResponse(**user_data)
+        user_response = _user_response_from_doc(user_data)
         
         return UserLoginResponse(
             access_token=access_token,
@@ -124,8 +139,7 @@ async def update_user_info(
 ):
     """Update current user information."""
     try:
-        users_collection = await get_collection(USERS_COLLECTION)
-        
+        users_collection = await get_users_collection()
         # Prepare update data
         update_data = user_update.dict(exclude_unset=True)
         update_data["updated_at"] = datetime.utcnow()
@@ -136,12 +150,13 @@ async def update_user_info(
             {"$set": update_data}
         )
         
+        invalidate_user_cache(current_user.id)
+
         # Get updated user
-        updated_user = await users_collection.find_one({"_id": ObjectId(current_user.id)})
-        updated_user["id"] = str(updated_user["_id"])
-        del updated_user["_id"]
-        
-        return UserResponse(**updated_user)
+        updated_user = await users_collection.find_one(
+            {"_id": ObjectId(current_user.id)}, USER_RESPONSE_PROJECTION
+        )
+        return _user_response_from_doc(updated_user)
         
     except Exception as e:
         logger.error(f"User update error: {e}")
@@ -160,8 +175,8 @@ async def verify_phone_number(
         # For now, we'll simulate phone verification
         # In a real app, you'd verify the SMS code here
         
-        users_collection = await get_collection(USERS_COLLECTION)
-        
+        users_collection = await get_users_collection()
+        wallets_collection = await get_collection(WALLETS_COLLECTION)
         await users_collection.update_one(
             {"_id": ObjectId(current_user.id)},
             {
@@ -172,7 +187,14 @@ async def verify_phone_number(
                 }
             }
         )
-        
+        # Keep the denormalized copy on the wallet in sync - P2P recipient
+        # lookup resolves by the wallet's phone_number
+        await wallets_collection.update_one(
+            {"user_id": str(current_user.id)},
+            {"$set": {"phone_number": verification_data.phone_number}}
+        )
+        invalidate_user_cache(current_user.id)
+
         return {"message": "Phone number verified successfully"}
         
     except Exception as e:
@@ -189,8 +211,7 @@ async def set_wallet_pin(
 ):
     """Set or update wallet PIN."""
     try:
-        users_collection = await get_collection(USERS_COLLECTION)
-        
+        users_collection = await get_users_collection()
         # For now, we'll store the PIN as plain text
         # In a real app, you'd hash the PIN before storing
         
@@ -204,6 +225,8 @@ async def set_wallet_pin(
             }
         )
         
+        invalidate_user_cache(current_user.id)
+
         return {"message": "Wallet PIN updated successfully"}
         
     except Exception as e:
@@ -2,12 +2,15 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.responses import RedirectResponse
 from google.oauth2 import id_token
 from google.auth.transport import requests
+import requests as _requests
 import httpx
 import asyncio
 from typing import Optional
+from urllib.parse import urlencode
 import logging
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 from models.user import UserCreate, UserResponse, GoogleAuthRequest
 from auth.jwt_handler import create_user_token, create_refresh_token
@@ -19,16 +22,72 @@ settings = get_settings()
 
 router = APIRouter()
 
-# Request deduplication to prevent multiple simultaneous calls
-_ongoing_requests = {}
+# Every input here is config-static, so build (and percent-encode) the
+# authorization URL once at import instead of f-string-ing it per request
+_GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/v2/auth?" + urlencode({
+    "client_id": settings.google_client_id,
+    "redirect_uri": settings.google_redirect_uri,
+    "response_type": "code",
+    "scope": "openid email profile",
+    "access_type": "offline",
+})
+
+class Singleflight:
+    """Collapse concurrent calls with the same key onto one task.
+
+    The lock closes the check-then-create race the old plain-dict version
+    had, and the try/finally pop means failed entries can never leak.
+    """
+
+    def __init__(self, timeout: float = 15.0):
+        self._lock = asyncio.Lock()
+        self._tasks: dict = {}
+        self._timeout = timeout
+
+    async def do(self, key, coro_fn):
+        async with self._lock:
+            task = self._tasks.get(key)
+            if task is None:
+                task = asyncio.create_task(self._run(key, coro_fn))
+                self._tasks[key] = task
+        # Bound how long waiters can pile up behind one exchange
+        return await asyncio.wait_for(asyncio.shield(task), timeout=self._timeout)
+
+    async def _run(self, key, coro_fn):
+        try:
+            return await coro_fn()
+        finally:
+            self._tasks.pop(key, None)
+
+# Request deduplication - duplicate code exchanges fail at Google with
+# invalid_grant, so concurrent submissions of the same code share one task
+_singleflight = Singleflight()
+
+# One pooled client for all Google API calls - keep-alive connections
+# amortize the TLS handshake to Google across logins instead of paying it
+# twice per authentication
+_http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+)
+
+async def close_http_client():
+    """Close the shared Google HTTP client (call on app shutdown)."""
+    await _http_client.aclose()
+
+# One transport for all id_token verifications - a fresh Request() builds a
+# new requests.Session (new TCP pool) per call, while a shared one reuses
+# the connection to Google's JWKS endpoint and its cached signing certs
+_google_request = requests.Request(session=_requests.Session())
 
 async def verify_google_token(token: str) -> dict:
     """Verify Google ID token and return user info."""
     try:
         # Verify the token with Google
         idinfo = id_token.verify_oauth2_token(
-            token, 
-            requests.Request(), 
+            token,
+            _google_request,
             settings.google_client_id
         )
         
@@ -48,6 +107,29 @@ async def verify_google_token(token: str) -> dict:
             detail="Invalid Google token"
         )
 
+def _user_response_from_doc(doc: dict) -> UserResponse:
+    """Build a UserResponse from our own Mongo document without validation.
+
+    model_construct skips Pydantic's coercion pass - safe here because the
+    data came from our own writes - and picking fields explicitly keeps
+    document-only keys (google_id, wallet_pin, ...) out of the response.
+    """
+    return UserResponse.model_construct(
+        id=str(doc["_id"]),
+        email=doc["email"],
+        full_name=doc.get("full_name", ""),
+        phone_number=doc.get("phone_number"),
+        profile_picture=doc.get("profile_picture"),
+        role=doc.get("role", "user"),
+        status=doc.get("status", "active"),
+        wallet_balance_kes=doc.get("wallet_balance_kes", 0.0),
+        wallet_balance_usdt=doc.get("wallet_balance_usdt", 0.0),
+        is_phone_verified=doc.get("is_phone_verified", False),
+        is_email_verified=doc.get("is_email_verified", False),
+        created_at=doc["created_at"],
+        updated_at=doc["updated_at"],
+    )
+
 async def get_or_create_user(google_user_info: dict) -> UserResponse:
     """Get existing user or create new one from Google info."""
     try:
@@ -65,44 +147,31 @@ async def get_or_create_user(google_user_info: dict) -> UserResponse:
         users_collection = await get_collection(USERS_COLLECTION)
         wallets_collection = await get_collection(WALLETS_COLLECTION)
         
-        # Check if user exists by Google ID
-        existing_user = await users_collection.find_one({
-            "google_id": google_user_info["sub"]
-        })
-        
-        if existing_user:
-            # Update last login
-            await users_collection.update_one(
-                {"_id": existing_user["_id"]},
-                {"$set": {"updated_at": datetime.utcnow()}}
-            )
-            
-            # Convert to response model
-            existing_user["id"] = str(existing_user["_id"])
-            del existing_user["_id"]
-            return UserResponse(**existing_user)
-        
-        # Check if user exists by email
-        existing_user = await users_collection.find_one({
-            "email": google_user_info["email"]
-        })
-        
+        now = datetime.utcnow()
+
+        # Returning user: find + last-login update fused into one round trip
+        existing_user = await users_collection.find_one_and_update(
+            {"google_id": google_user_info["sub"]},
+            {"$set": {"updated_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
         if existing_user:
-            # Link Google account to existing user
-            await users_collection.update_one(
-                {"_id": existing_user["_id"]},
-                {
-                    "$set": {
-                        "google_id": google_user_info["sub"],
-                        "updated_at": datetime.utcnow()
-                    }
+            return _user_response_from_doc(existing_user)
+
+        # Pre-Google account with the same email: find + link in one round trip
+        existing_user = await users_collection.find_one_and_update(
+            {"email": google_user_info["email"]},
+            {
+                "$set": {
+                    "google_id": google_user_info["sub"],
+                    "updated_at": now
                 }
-            )
-            
-            existing_user["id"] = str(existing_user["_id"])
-            del existing_user["_id"]
-            return UserResponse(**existing_user)
-        
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if existing_user:
+            return _user_response_from_doc(existing_user)
+
         # Create new user
         new_user = {
             "_id": ObjectId(),
@@ -116,13 +185,10 @@ async def get_or_create_user(google_user_info: dict) -> UserResponse:
             "wallet_balance_usdt": 0.0,
             "is_phone_verified": False,
             "is_email_verified": True,  # Google emails are verified
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "created_at": now,
+            "updated_at": now
         }
         
-        # Insert user
-        await users_collection.insert_one(new_user)
-        
         # Create wallet for new user
         new_wallet = {
             "_id": ObjectId(),
@@ -134,16 +200,18 @@ async def get_or_create_user(google_user_info: dict) -> UserResponse:
             "total_fees": 0.0,
             "daily_transfer_count": 0,
             "daily_transfer_amount": 0.0,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "created_at": now,
+            "updated_at": now
         }
         
-        await wallets_collection.insert_one(new_wallet)
-        
-        # Convert to response model
-        new_user["id"] = str(new_user["_id"])
-        del new_user["_id"]
-        return UserResponse(**new_user)
+        # Both _ids are generated client-side, so the two inserts have no
+        # ordering dependency - fire them concurrently
+        await asyncio.gather(
+            users_collection.insert_one(new_user),
+            wallets_collection.insert_one(new_wallet)
+        )
+
+        return _user_response_from_doc(new_user)
         
     except Exception as e:
         logger.error(f"Error creating/getting user: {e}")
@@ -155,37 +223,25 @@ async def get_or_create_user(google_user_info: dict) -> UserResponse:
 @router.get("/google/login")
 async def google_login():
     """Redirect to Google OAuth login."""
-    google_auth_url = f"https://accounts.google.com/o/oauth2/v2/auth?" \
-                      f"client_id={settings.google_client_id}&" \
-                      f"redirect_uri={settings.google_redirect_uri}&" \
-                      f"response_type=code&" \
-                      f"scope=openid email profile&" \
-                      f"access_type=offline"
-    
-    return RedirectResponse(url=google_auth_url)
+    return RedirectResponse(url=_GOOGLE_AUTH_URL)
 
 @router.post("/google")
 async def google_auth(request: GoogleAuthRequest):
     """Exchange Google authorization code for tokens."""
-    # Request deduplication - prevent multiple simultaneous calls with same code
+    # Concurrent submissions of the same code share one exchange task
     request_key = f"{request.code[:20]}_{request.redirect_uri}"
-    
-    if request_key in _ongoing_requests:
-        logger.warning(f"Duplicate request detected for code: {request.code[:10]}...")
-        # Wait for the ongoing request to complete
-        try:
-            result = await _ongoing_requests[request_key]
-            logger.info(f"Returning result from ongoing request for code: {request.code[:10]}...")
-            return result
-        except Exception as e:
-            logger.error(f"Ongoing request failed: {e}")
-            # Remove failed request and continue with new one
-            del _ongoing_requests[request_key]
-    
-    # Create a future for this request
-    future = asyncio.Future()
-    _ongoing_requests[request_key] = future
-    
+    try:
+        return await _singleflight.do(request_key, lambda: _do_google_auth(request))
+    except asyncio.TimeoutError:
+        # Upstream (Google) took longer than the singleflight bound - fail
+        # the request cleanly rather than holding the worker
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Google authentication timed out. Please try again."
+        )
+
+async def _do_google_auth(request: GoogleAuthRequest):
+    """Perform the actual code-for-tokens exchange with Google."""
     try:
         # Debug logging
         logger.info(f"Google auth request received - code: {request.code[:10]}..., redirect_uri: {request.redirect_uri}")
@@ -211,55 +267,59 @@ async def google_auth(request: GoogleAuthRequest):
         
         logger.info(f"Token exchange data: {token_data}")
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(token_url, data=token_data)
-            logger.info(f"Google token response status: {response.status_code}")
+        response = await _http_client.post(token_url, data=token_data)
+        logger.info(f"Google token response status: {response.status_code}")
             
-            if response.status_code != 200:
-                error_text = response.text
-                logger.error(f"Google token response error: {error_text}")
+        if response.status_code != 200:
+            error_text = response.text
+            logger.error(f"Google token response error: {error_text}")
                 
-                # Parse error response for better error messages
-                try:
-                    error_data = response.json()
-                    if error_data.get("error") == "invalid_grant":
-                        raise HTTPException(
-                            status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="Authorization code expired or invalid. Please try logging in again."
-                        )
-                    else:
-                        raise HTTPException(
-                            status_code=status.HTTP_400_BAD_REQUEST,
-                            detail=f"Google authentication failed: {error_data.get('error_description', 'Unknown error')}"
-                        )
-                except:
+            # Parse error response for better error messages
+            try:
+                error_data = response.json()
+                if error_data.get("error") == "invalid_grant":
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Google authentication failed: {error_text}"
+                        detail="Authorization code expired or invalid. Please try logging in again."
                     )
+                else:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Google authentication failed: {error_data.get('error_description', 'Unknown error')}"
+                    )
+            except:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Google authentication failed: {error_text}"
+                )
             
-            token_response = response.json()
-        
-        # Get user info using access token
-        user_info_url = "https://www.googleapis.com/oauth2/v2/userinfo"
-        headers = {"Authorization": f"Bearer {token_response['access_token']}"}
-        
-        logger.info(f"Getting user info from: {user_info_url}")
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(user_info_url, headers=headers)
+        token_response = response.json()
+
+        if "id_token" in token_response:
+            # The openid scope returns an id_token whose verified claims
+            # already carry sub/email/name/picture - decoding it locally
+            # saves the whole userinfo round trip to Google
+            user_info = await verify_google_token(token_response["id_token"])
+        else:
+            # Fallback: get user info using the access token
+            user_info_url = "https://www.googleapis.com/oauth2/v2/userinfo"
+            headers = {"Authorization": f"Bearer {token_response['access_token']}"}
+
+            logger.info(f"Getting user info from: {user_info_url}")
+
+            response = await _http_client.get(user_info_url, headers=headers)
             logger.info(f"User info response status: {response.status_code}")
-            
+
             if response.status_code != 200:
                 logger.error(f"User info response error: {response.text}")
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Failed to get user information from Google"
                 )
-            
+
             user_info = response.json()
             logger.info(f"User info received: {user_info}")
-            
+
             # Validate required fields and normalize field names
             if 'sub' not in user_info and 'id' not in user_info:
                 logger.error(f"Missing 'sub' or 'id' field in user info: {user_info}")
@@ -267,12 +327,12 @@ async def google_auth(request: GoogleAuthRequest):
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid user information from Google"
                 )
-            
+
             # Normalize field names - Google sometimes uses 'id' instead of 'sub'
             if 'sub' not in user_info and 'id' in user_info:
                 user_info['sub'] = user_info['id']
                 logger.info(f"Normalized 'id' to 'sub': {user_info['sub']}")
-        
+
         # Get or create user
         user = await get_or_create_user(user_info)
         
@@ -280,29 +340,17 @@ async def google_auth(request: GoogleAuthRequest):
         access_token = create_user_token(user.id, user.email)
         refresh_token = create_refresh_token(user.id)
         
-        result = {
+        return {
             "user": user,
             "access_token": access_token,
             "refresh_token": refresh_token,
             "token_type": "bearer"
         }
-        
-        # Set the future result for other waiting requests
-        future.set_result(result)
-        
-        # Clean up the request tracking
-        del _ongoing_requests[request_key]
-        
-        return result
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Google auth error: {e}")
-        # Set the future exception for other waiting requests
-        future.set_exception(e)
-        
-        # Clean up the request tracking
-        del _ongoing_requests[request_key]
-        
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Google authentication failed: {str(e)}"
@@ -322,20 +370,23 @@ async def google_callback(code: str):
             "redirect_uri": settings.google_redirect_uri
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(token_url, data=token_data)
-            response.raise_for_status()
-            token_response = response.json()
-        
-        # Get user info using access token
-        user_info_url = "https://www.googleapis.com/oauth2/v2/userinfo"
-        headers = {"Authorization": f"Bearer {token_response['access_token']}"}
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(user_info_url, headers=headers)
+        response = await _http_client.post(token_url, data=token_data)
+        response.raise_for_status()
+        token_response = response.json()
+
+        if "id_token" in token_response:
+            # Same shortcut as google_auth: the verified id_token claims
+            # replace the userinfo round trip
+            user_info = await verify_google_token(token_response["id_token"])
+        else:
+            # Fallback: get user info using the access token
+            user_info_url = "https://www.googleapis.com/oauth2/v2/userinfo"
+            headers = {"Authorization": f"Bearer {token_response['access_token']}"}
+
+            response = await _http_client.get(user_info_url, headers=headers)
             response.raise_for_status()
             user_info = response.json()
-        
+
         # Get or create user
         user = await get_or_create_user(user_info)
         
@@ -343,19 +394,22 @@ async def google_callback(code: str):
         access_token = create_user_token(user.id, user.email)
         refresh_token = create_refresh_token(user.id)
         
-        # Redirect to frontend with tokens
-        frontend_url = f"http://localhost:5173/auth/google/callback?" \
-                      f"access_token={access_token}&" \
-                      f"refresh_token={refresh_token}&" \
-                      f"user_id={user.id}"
-        
-        return RedirectResponse(url=frontend_url)
-        
+        # Redirect to frontend with tokens - urlencode percent-escapes the
+        # token material so URL-special characters can't break the redirect
+        params = urlencode({
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "user_id": user.id
+        })
+        return RedirectResponse(
+            url=f"{settings.frontend_url}/auth/google/callback?{params}"
+        )
+
     except Exception as e:
         logger.error(f"Google callback error: {e}")
         # Redirect to frontend with error
-        error_url = f"http://localhost:5173/auth/error?message=Authentication failed"
-        return RedirectResponse(url=error_url)
+        params = urlencode({"message": "Authentication failed"})
+        return RedirectResponse(url=f"{settings.frontend_url}/auth/error?{params}")
 
 @router.post("/refresh")
 async def refresh_token(refresh_token: str):
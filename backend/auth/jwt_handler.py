@@ -1,7 +1,10 @@
+import hashlib
+import time
 from datetime import datetime, timedelta
 from typing import Optional, TYPE_CHECKING
-from jose import JWTError, jwt
-from fastapi import HTTPException, status, Depends
+from cachetools import TTLCache
+import jwt
+from fastapi import HTTPException, Request, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from config.settings import get_settings
 from database.mongodb import get_collection, USERS_COLLECTION
@@ -17,30 +20,50 @@ settings = get_settings()
 # Security scheme
 security = HTTPBearer()
 
-# JWT Configuration
+# JWT Configuration. PyJWT rides on cryptography's C/OpenSSL primitives, so
+# signing and verification avoid the pure-Python HMAC path. When Ed25519 PEM
+# keys are configured the tokens use EdDSA (faster to verify and no shared
+# secret); otherwise HS256 with the symmetric secret, as before.
 SECRET_KEY = settings.jwt_secret_key
 ALGORITHM = settings.jwt_algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.jwt_access_token_expire_minutes
 
+if ALGORITHM == "EdDSA" and settings.jwt_private_key and settings.jwt_public_key:
+    _SIGNING_KEY = settings.jwt_private_key
+    _VERIFY_KEY = settings.jwt_public_key
+else:
+    ALGORITHM = "HS256"
+    _SIGNING_KEY = _VERIFY_KEY = SECRET_KEY
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a new JWT access token."""
     to_encode = data.copy()
     
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    
+    expire = datetime.utcnow() + (
+        expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _SIGNING_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Verified-token cache keyed by a short blake2b digest of the raw token -
+# collision-resistant and cheaper to store than the JWT itself. Warm tokens
+# skip the HMAC verification and JSON parse entirely; the exp claim is still
+# honored on every hit.
+_token_cache = TTLCache(maxsize=50_000, ttl=60)
+
 def verify_token(token: str) -> dict:
     """Verify and decode a JWT token."""
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _token_cache.get(cache_key)
+    if cached is not None and cached.get("exp", 0) > time.time():
+        return cached
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, _VERIFY_KEY, algorithms=[ALGORITHM])
+        _token_cache[cache_key] = payload
         return payload
-    except JWTError as e:
+    except jwt.PyJWTError as e:
         logger.error(f"JWT verification failed: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -48,39 +71,71 @@ def verify_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# Authenticated-user cache: every authenticated endpoint otherwise pays a
+# Mongo round trip for the same user document. Endpoints that mutate the
+# user call invalidate_user_cache() so changes show up immediately.
+_user_cache = TTLCache(maxsize=10_000, ttl=30)
+
+def invalidate_user_cache(user_id: str) -> None:
+    """Drop a cached user after mutating their document."""
+    _user_cache.pop(user_id, None)
+
+async def _load_user(user_id: str):
+    """Load a user by id, served from the short TTL cache when warm."""
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    users_collection = await get_collection(USERS_COLLECTION)
+    user_data = await users_collection.find_one({"_id": ObjectId(user_id)})
+    if user_data is None:
+        return None
+
+    # Convert MongoDB document to User model
+    user_data["id"] = str(user_data["_id"])
+    del user_data["_id"]
+
+    # Import User here to avoid circular imports
+    from models.user import User
+    user = User(**user_data)
+    _user_cache[user_id] = user
+    return user
+
+async def get_current_user(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
     """Get the current authenticated user from JWT token."""
+    # Resolved once per request: FastAPI dedups identical Depends calls, and
+    # request.state covers resolvers with different signatures (middleware,
+    # sub-dependencies) so the JWT + Mongo work never repeats in a request
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+
     try:
         token = credentials.credentials
         payload = verify_token(token)
         user_id: str = payload.get("sub")
-        
+
         if user_id is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        
-        # Get user from database
-        users_collection = await get_collection(USERS_COLLECTION)
-        user_data = await users_collection.find_one({"_id": ObjectId(user_id)})
-        
-        if user_data is None:
+
+        user = await _load_user(user_id)
+        if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        
-        # Convert MongoDB document to User model
-        user_data["id"] = str(user_data["_id"])
-        del user_data["_id"]
-        
-        # Import User here to avoid circular imports
-        from models.user import User
-        return User(**user_data)
-        
+
+        request.state.user = user
+        return user
+
     except HTTPException:
         raise
     except Exception as e:
@@ -121,22 +176,9 @@ async def get_current_user_from_token(token: str):
         
         if user_id is None:
             return None
-        
-        # Get user from database
-        users_collection = await get_collection(USERS_COLLECTION)
-        user_data = await users_collection.find_one({"_id": ObjectId(user_id)})
-        
-        if user_data is None:
-            return None
-        
-        # Convert MongoDB document to User model
-        user_data["id"] = str(user_data["_id"])
-        del user_data["_id"]
-        
-        # Import User here to avoid circular imports
-        from models.user import User
-        return User(**user_data)
-        
+
+        return await _load_user(user_id)
+
     except Exception as e:
         logger.error(f"Error getting user from token: {e}")
         return None
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from typing import Optional
 import os
@@ -15,6 +16,11 @@ class Settings(BaseSettings):
     # Database settings
     mongodb_url: str = "mongodb://localhost:27017"
     mongodb_database: str = "trade_machine"
+    # Connection-pool tuning (env-overridable per deployment size)
+    mongodb_max_pool_size: int = 200
+    mongodb_min_pool_size: int = 10
+    mongodb_max_idle_time_ms: int = 300_000
+    mongodb_wait_queue_timeout_ms: int = 2000
     
     # Redis settings
     redis_url: str = "redis://localhost:6379"
@@ -23,11 +29,18 @@ class Settings(BaseSettings):
     jwt_secret_key: str = "your-secret-key-change-in-production"
     jwt_algorithm: str = "HS256"
     jwt_access_token_expire_minutes: int = 30
+    # Optional Ed25519 PEM key pair - when set (with jwt_algorithm=EdDSA),
+    # tokens are signed asymmetrically instead of with the shared secret
+    jwt_private_key: str = ""
+    jwt_public_key: str = ""
     
     # Google OAuth settings
     google_client_id: str = ""
     google_client_secret: str = ""
     google_redirect_uri: str = "http://localhost:5173/auth/google/callback"
+
+    # Frontend settings
+    frontend_url: str = "http://localhost:5173"
     
     # Paystack settings
     paystack_secret_key: str = ""
@@ -51,6 +64,12 @@ class Settings(BaseSettings):
         "https://yourdomain.com"
     ]
     
+    # Explicit CORS allow-lists: echoing "*" makes Starlette copy the
+    # preflight's requested headers per request; a fixed list is served as
+    # a constant
+    cors_allow_methods: list = ["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"]
+    cors_allow_headers: list = ["Authorization", "Content-Type", "X-Request-ID"]
+
     # Rate limiting
     rate_limit_per_minute: int = 60
     
@@ -58,8 +77,9 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = False
 
-# Global settings instance
-settings = Settings()
-
+# Constructed once per process: Settings() parses .env and runs Pydantic
+# validation, and lru_cache makes Depends(get_settings) hand back the same
+# instance (and keeps test-time dependency_overrides cheap)
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    return settings
+    return Settings()
@@ -1,35 +1,50 @@
+import asyncio
+import logging
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel
 from pymongo.errors import DuplicateKeyError, ConnectionFailure
-from typing import Optional
-import logging
 from config.settings import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 class MongoDB:
-    client: Optional[AsyncIOMotorClient] = None
-    database = None
+    # The Motor client is created eagerly at import: construction is
+    # non-blocking (connections are opened lazily on first operation), and a
+    # single pooled client per process is what keeps Mongo I/O off the event
+    # loop. Pool bounds cap concurrent operations per worker.
+    # Explicit timeouts so a slow or partitioned Mongo fails fast instead of
+    # parking request coroutines indefinitely and exhausting the worker.
+    client: AsyncIOMotorClient = AsyncIOMotorClient(
+        settings.mongodb_url,
+        maxPoolSize=settings.mongodb_max_pool_size,
+        minPoolSize=settings.mongodb_min_pool_size,
+        maxIdleTimeMS=settings.mongodb_max_idle_time_ms,
+        waitQueueTimeoutMS=settings.mongodb_wait_queue_timeout_ms,
+        serverSelectionTimeoutMS=5000,
+        connectTimeoutMS=5000,
+        socketTimeoutMS=10000,
+        uuidRepresentation="standard",
+    )
+    database = client[settings.mongodb_database]
 
     @classmethod
     async def connect_to_mongo(cls):
-        """Create database connection."""
+        """Verify the database connection and create indexes."""
         try:
-            cls.client = AsyncIOMotorClient(settings.mongodb_url)
-            cls.database = cls.client[settings.mongodb_database]
-            
             # Test the connection
             await cls.client.admin.command('ping')
             logger.info("Successfully connected to MongoDB")
-            
+
             # Create indexes
             await cls.create_indexes()
-            
+
         except ConnectionFailure as e:
-            logger.error(f"Failed to connect to MongoDB: {e}")
+            logger.error("Failed to connect to MongoDB: %s", e)
             raise
         except Exception as e:
-            logger.error(f"Unexpected error connecting to MongoDB: {e}")
+            logger.error("Unexpected error connecting to MongoDB: %s", e)
             raise
 
     @classmethod
@@ -43,48 +58,61 @@ class MongoDB:
     async def create_indexes(cls):
         """Create database indexes for better performance."""
         try:
-            # Users collection indexes
-            await cls.database.users.create_index("email", unique=True)
-            await cls.database.users.create_index("google_id", sparse=True)
-            await cls.database.users.create_index("phone_number", sparse=True)
-            
-            # Wallets collection indexes
-            await cls.database.wallets.create_index("user_id", unique=True)
-            
-            # Transactions collection indexes
-            await cls.database.transactions.create_index("user_id")
-            await cls.database.transactions.create_index("reference", unique=True)
-            await cls.database.transactions.create_index("created_at")
-            await cls.database.transactions.create_index("status")
-            
-            # Bots collection indexes
-            await cls.database.bots.create_index("user_id")
-            await cls.database.bots.create_index("status")
-            
+            # One createIndexes command per collection, all collections in
+            # flight concurrently - a single startup round trip per
+            # collection instead of one per index
+            await asyncio.gather(
+                cls.database.users.create_indexes([
+                    IndexModel("email", unique=True),
+                    IndexModel("google_id", unique=True, sparse=True,
+                               background=True),
+                    IndexModel("phone_number", sparse=True),
+                ]),
+                cls.database.wallets.create_indexes([
+                    IndexModel("user_id", unique=True),
+                ]),
+                # Transactions: history reads are "this user's recent
+                # transactions, maybe filtered by status" - compound indexes
+                # serve those sorted pages directly, and (user_id, ...)
+                # prefixes make a standalone user_id index redundant
+                cls.database.transactions.create_indexes([
+                    IndexModel("reference", unique=True),
+                    IndexModel([("user_id", 1), ("created_at", -1)]),
+                    IndexModel([("user_id", 1), ("status", 1),
+                                ("created_at", -1)]),
+                    IndexModel([("status", 1), ("created_at", -1)]),
+                    IndexModel("created_at"),
+                ]),
+                # Bots: every bot_router query filters by (user_id, _id),
+                # and listings sort by created_at, so compound indexes keep
+                # those off collection scans
+                cls.database.bots.create_indexes([
+                    IndexModel([("user_id", 1), ("_id", 1)], background=True),
+                    IndexModel([("user_id", 1), ("created_at", -1)],
+                               background=True),
+                    IndexModel("status"),
+                ]),
+            )
+
             logger.info("Database indexes created successfully")
-            
+
         except Exception as e:
-            logger.error(f"Error creating indexes: {e}")
+            logger.error("Error creating indexes: %s", e)
 
     @classmethod
     def get_collection(cls, collection_name: str):
         """Get a collection from the database."""
-        if cls.database is None:
-            raise ConnectionError("Database not connected")
         return cls.database[collection_name]
 
-# Database connection functions
+# Database connection functions - kept async for the existing await call
+# sites, but they no longer trigger a connection check per call
 async def get_database():
     """Get database instance."""
-    if MongoDB.database is None:
-        await MongoDB.connect_to_mongo()
     return MongoDB.database
 
 async def get_collection(collection_name: str):
     """Get a specific collection."""
-    if MongoDB.database is None:
-        await MongoDB.connect_to_mongo()
-    return MongoDB.get_collection(collection_name)
+    return MongoDB.database[collection_name]
 
 # Collection names
 USERS_COLLECTION = "users"
@@ -0,0 +1,28 @@
+"""One-shot migration: convert bots.user_id from string to ObjectId.
+
+Bot documents written before the ObjectId switch stored user_id as
+str(ObjectId). Run once against the live database:
+
+    python migrate_bot_user_ids.py
+"""
+import asyncio
+
+from bson import ObjectId
+
+from database.mongodb import MongoDB, BOTS_COLLECTION
+
+
+async def migrate():
+    bots = MongoDB.database[BOTS_COLLECTION]
+    migrated = 0
+    async for bot in bots.find({"user_id": {"$type": "string"}}, {"user_id": 1}):
+        await bots.update_one(
+            {"_id": bot["_id"]},
+            {"$set": {"user_id": ObjectId(bot["user_id"])}}
+        )
+        migrated += 1
+    print(f"Migrated {migrated} bot document(s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -26,9 +26,17 @@ class UserUpdate(BaseModel):
     profile_picture: Optional[str] = None
     wallet_pin: Optional[str] = None
 
+# Motor projection for reads that only feed UserResponse - keeps secrets
+# and fields the response drops (wallet_pin, google_id) off the wire.
+# Keep in sync with UserResponse below.
+USER_RESPONSE_PROJECTION = {"wallet_pin": 0, "google_id": 0}
+
 class UserResponse(BaseModel):
-    model_config = ConfigDict(from_attributes=True)
-    
+    # frozen: response objects are write-once snapshots, and immutability
+    # lets them be shared/cached (e.g. the OAuth user cache) without
+    # defensive copies
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     id: str
     email: str
     full_name: str
@@ -51,9 +51,30 @@ class TransactionCreate(BaseModel):
     recipient_account: Optional[str] = None
     description: Optional[str] = None
 
+# Motor projection matching what TransactionResponse exposes - history
+# endpoints pass this so Mongo never ships fields the page won't return.
+# Keep in sync with TransactionResponse below.
+TRANSACTION_RESPONSE_PROJECTION = {
+    "transaction_type": 1,
+    "amount": 1,
+    "currency": 1,
+    "recipient_phone": 1,
+    "recipient_bank": 1,
+    "recipient_account": 1,
+    "description": 1,
+    "fee": 1,
+    "total_amount": 1,
+    "status": 1,
+    "reference": 1,
+    "created_at": 1,
+    "completed_at": 1,
+}
+
 class TransactionResponse(BaseModel):
-    model_config = ConfigDict(from_attributes=True)
-    
+    # frozen: instances are built once per response and never mutated, so
+    # immutability costs nothing and makes history pages safely shareable
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     id: str
     transaction_type: TransactionType
     amount: float
@@ -96,8 +117,9 @@ class WalletUpdate(BaseModel):
     total_fees: Optional[float] = None
 
 class WalletResponse(BaseModel):
-    model_config = ConfigDict(from_attributes=True)
-    
+    # frozen: see TransactionResponse - write-once API snapshots
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     id: str
     balance_kes: float
     balance_usdt: float
@@ -1,14 +1,38 @@
+import asyncio
 import httpx
 import logging
 import base64
 import json
+import re
+import time
 from typing import Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
 from config.settings import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+MPESA_BASE_URL = "https://sandbox.safaricom.co.ke"  # Use production URL for live
+
+# Accepts +2547XXXXXXXX, 2547XXXXXXXX, 07XXXXXXXX or bare 7XXXXXXXX and
+# captures the 9 significant digits in one pass
+_MSISDN_RE = re.compile(r"^(?:\+?254|0)?(\d{9})$")
+
+# One pooled client for all Safaricom calls - keep-alive connections skip
+# the per-call TCP/TLS handshake and HTTP/2 multiplexes concurrent payment
+# requests over a single connection
+_http = httpx.AsyncClient(
+    base_url=MPESA_BASE_URL,
+    http2=True,
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+)
+
+async def close_http_client():
+    """Close the shared M-Pesa HTTP client (call on app shutdown)."""
+    await _http.aclose()
+
 class MPESAService:
     def __init__(self):
         # M-Pesa API credentials (these would come from environment variables)
@@ -16,66 +40,112 @@ class MPESAService:
         self.consumer_secret = "your_mpesa_consumer_secret"
         self.business_shortcode = "your_business_shortcode"
         self.passkey = "your_mpesa_passkey"
-        self.base_url = "https://sandbox.safaricom.co.ke"  # Use production URL for live
+        self.base_url = MPESA_BASE_URL
         
-        if not all([self.consumer_key, self.consumer_secret, self.business_shortcode, self.passkey]):
+        # Computed once - every payment path branches on this, so don't
+        # rebuild the list and re-run all() per call
+        self._configured = all([
+            self.consumer_key, self.consumer_secret,
+            self.business_shortcode, self.passkey
+        ])
+        if not self._configured:
             logger.warning("M-Pesa credentials not fully configured")
+
+        # Credentials never change at runtime, so encode the Basic auth
+        # header once instead of re-base64ing it per token refresh
+        creds = f"{self.consumer_key}:{self.consumer_secret}".encode()
+        self._basic_auth_header = "Basic " + base64.b64encode(creds).decode()
+
+        # OAuth token cache: M-Pesa tokens live ~3599s, so one fetch serves
+        # every payment call in that window. The lock stops concurrent
+        # cache-miss callers from thundering the OAuth endpoint.
+        self._token: Optional[str] = None
+        self._token_expiry: float = 0.0
+        self._token_lock = asyncio.Lock()
+
+    async def _get_access_token(self) -> Optional[str]:
+        """Get an M-Pesa access token, cached until shortly before expiry."""
+        # Refresh 60s early so in-flight calls never carry a stale token
+        if self._token and time.monotonic() < self._token_expiry - 60:
+            return self._token
+
+        async with self._token_lock:
+            # Another coroutine may have refreshed while we waited
+            if self._token and time.monotonic() < self._token_expiry - 60:
+                return self._token
+            try:
+                headers = {
+                    "Authorization": self._basic_auth_header,
+                    "Content-Type": "application/json"
+                }
+
+                url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
+
+                # For now, use a mock token since we don't have real
+                # credentials. In production:
+                #   response = await _http.get(url, headers=headers)
+                #   payload = response.json()
+                #   token, expires_in = payload["access_token"], int(payload["expires_in"])
+                token, expires_in = "mock_access_token", 3599
+
+                self._token = token
+                self._token_expiry = time.monotonic() + expires_in
+                return self._token
+
+            except Exception as e:
+                logger.error("Error getting M-Pesa access token: %s", e)
+                return None
     
-    def _get_access_token(self) -> Optional[str]:
-        """Get M-Pesa access token."""
-        try:
-            # Encode consumer key and secret
-            credentials = f"{self.consumer_key}:{self.consumer_secret}"
-            encoded_credentials = base64.b64encode(credentials.encode()).decode()
-            
-            headers = {
-                "Authorization": f"Basic {encoded_credentials}",
-                "Content-Type": "application/json"
-            }
-            
-            url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
-            
-            # For now, return a mock token since we don't have real credentials
-            # In production, you'd make the actual HTTP request
-            return "mock_access_token"
-            
-        except Exception as e:
-            logger.error(f"Error getting M-Pesa access token: {e}")
-            return None
-    
+    @staticmethod
+    def _normalize_msisdn(phone_number: str) -> str:
+        """Normalize a phone number to M-Pesa's 254XXXXXXXXX format.
+
+        Raises ValueError for malformed input, so a bad number fails here
+        instead of costing a round trip to Safaricom.
+        """
+        match = _MSISDN_RE.match(phone_number.strip())
+        if not match:
+            raise ValueError(f"Invalid phone number: {phone_number}")
+        return "254" + match.group(1)
+
     def _generate_timestamp(self) -> str:
-        """Generate timestamp in M-Pesa format."""
-        return datetime.now().strftime("%Y%m%d%H%M%S")
+        """Generate timestamp in M-Pesa format (EAT, UTC+3).
+
+        datetime.now() would resolve the container's local timezone per
+        call and silently produce wrong timestamps when TZ is not
+        Africa/Nairobi; UTC plus the fixed EAT offset (no DST) is both
+        cheaper and correct everywhere.
+        """
+        return (datetime.utcnow() + timedelta(hours=3)).strftime("%Y%m%d%H%M%S")
     
-    def _generate_password(self) -> str:
-        """Generate M-Pesa password."""
+    def _fresh_auth(self) -> tuple:
+        """Generate a matching (timestamp, password) pair for a request.
+
+        The password embeds the timestamp, so both must come from the same
+        instant - generating them separately could straddle a second
+        boundary and produce a payload M-Pesa rejects.
+        """
         timestamp = self._generate_timestamp()
         password_string = f"{self.business_shortcode}{self.passkey}{timestamp}"
-        return base64.b64encode(password_string.encode()).decode()
+        return timestamp, base64.b64encode(password_string.encode()).decode()
     
     async def stk_push(self, phone_number: str, amount: float, reference: str, description: str = "Wallet deposit") -> Dict[str, Any]:
         """Initiate STK push for mobile money deposit."""
         try:
-            if not all([self.consumer_key, self.consumer_secret, self.business_shortcode, self.passkey]):
+            if not self._configured:
                 return {
                     "success": False,
                     "error": "M-Pesa not configured"
                 }
             
-            access_token = self._get_access_token()
+            access_token = await self._get_access_token()
             if not access_token:
                 return {
                     "success": False,
                     "error": "Failed to get access token"
                 }
             
-            # Format phone number (remove +254 and add 254)
-            if phone_number.startswith('+254'):
-                phone_number = phone_number[1:]
-            elif phone_number.startswith('0'):
-                phone_number = '254' + phone_number[1:]
-            elif not phone_number.startswith('254'):
-                phone_number = '254' + phone_number
+            phone_number = self._normalize_msisdn(phone_number)
             
             url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
             headers = {
@@ -83,10 +153,11 @@ class MPESAService:
                 "Content-Type": "application/json"
             }
             
+            timestamp, password = self._fresh_auth()
             data = {
                 "BusinessShortCode": self.business_shortcode,
-                "Password": self._generate_password(),
-                "Timestamp": self._generate_timestamp(),
+                "Password": password,
+                "Timestamp": timestamp,
                 "TransactionType": "CustomerPayBillOnline",
                 "Amount": int(amount),
                 "PartyA": phone_number,
@@ -97,11 +168,12 @@ class MPESAService:
                 "TransactionDesc": description
             }
             
-            # For now, return mock response since we don't have real credentials
-            # In production, you'd make the actual HTTP request
+            # For now, return mock response since we don't have real
+            # credentials. In production:
+            #   response = await _http.post(url, json=data, headers=headers)
             return {
                 "success": True,
-                "CheckoutRequestID": f"ws_CO_{reference}_{int(datetime.now().timestamp())}",
+                "CheckoutRequestID": f"ws_CO_{reference}_{int(datetime.utcnow().timestamp())}",
                 "MerchantRequestID": f"mock_merchant_{reference}",
                 "ResponseCode": "0",
                 "ResponseDescription": "Success. Request accepted for processing",
@@ -109,7 +181,7 @@ class MPESAService:
             }
             
         except Exception as e:
-            logger.error(f"Error initiating M-Pesa STK push: {e}")
+            logger.error("Error initiating M-Pesa STK push: %s", e)
             return {
                 "success": False,
                 "error": str(e)
@@ -118,13 +190,13 @@ class MPESAService:
     async def c2b_register_urls(self) -> Dict[str, Any]:
         """Register C2B URLs for callbacks."""
         try:
-            if not all([self.consumer_key, self.consumer_secret]):
+            if not self._configured:
                 return {
                     "success": False,
                     "error": "M-Pesa not configured"
                 }
             
-            access_token = self._get_access_token()
+            access_token = await self._get_access_token()
             if not access_token:
                 return {
                     "success": False,
@@ -152,7 +224,7 @@ class MPESAService:
             }
             
         except Exception as e:
-            logger.error(f"Error registering M-Pesa C2B URLs: {e}")
+            logger.error("Error registering M-Pesa C2B URLs: %s", e)
             return {
                 "success": False,
                 "error": str(e)
@@ -161,26 +233,20 @@ class MPESAService:
     async def b2c_payment(self, phone_number: str, amount: float, reference: str, description: str = "Wallet withdrawal") -> Dict[str, Any]:
         """Initiate B2C payment (withdrawal to mobile money)."""
         try:
-            if not all([self.consumer_key, self.consumer_secret, self.business_shortcode]):
+            if not self._configured:
                 return {
                     "success": False,
                     "error": "M-Pesa not configured"
                 }
             
-            access_token = self._get_access_token()
+            access_token = await self._get_access_token()
             if not access_token:
                 return {
                     "success": False,
                     "error": "Failed to get access token"
                 }
             
-            # Format phone number
-            if phone_number.startswith('+254'):
-                phone_number = phone_number[1:]
-            elif phone_number.startswith('0'):
-                phone_number = '254' + phone_number[1:]
-            elif not phone_number.startswith('254'):
-                phone_number = '254' + phone_number
+            phone_number = self._normalize_msisdn(phone_number)
             
             url = f"{self.base_url}/mpesa/b2c/v1/paymentrequest"
             headers = {
@@ -211,7 +277,7 @@ class MPESAService:
             }
             
         except Exception as e:
-            logger.error(f"Error initiating M-Pesa B2C payment: {e}")
+            logger.error("Error initiating M-Pesa B2C payment: %s", e)
             return {
                 "success": False,
                 "error": str(e)
@@ -220,13 +286,13 @@ class MPESAService:
     async def check_transaction_status(self, checkout_request_id: str) -> Dict[str, Any]:
         """Check the status of an STK push transaction."""
         try:
-            if not all([self.consumer_key, self.consumer_secret]):
+            if not self._configured:
                 return {
                     "success": False,
                     "error": "M-Pesa not configured"
                 }
             
-            access_token = self._get_access_token()
+            access_token = await self._get_access_token()
             if not access_token:
                 return {
                     "success": False,
@@ -239,10 +305,11 @@ class MPESAService:
                 "Content-Type": "application/json"
             }
             
+            timestamp, password = self._fresh_auth()
             data = {
                 "BusinessShortCode": self.business_shortcode,
-                "Password": self._generate_password(),
-                "Timestamp": self._generate_timestamp(),
+                "Password": password,
+                "Timestamp": timestamp,
                 "CheckoutRequestID": checkout_request_id
             }
             
@@ -255,15 +322,23 @@ class MPESAService:
                 "ResultDesc": "The service request is processed successfully.",
                 "Amount": 100,
                 "MpesaReceiptNumber": f"mock_receipt_{checkout_request_id}",
-                "TransactionDate": datetime.now().strftime("%Y%m%d%H%M%S")
+                "TransactionDate": self._generate_timestamp()
             }
             
         except Exception as e:
-            logger.error(f"Error checking M-Pesa transaction status: {e}")
+            logger.error("Error checking M-Pesa transaction status: %s", e)
             return {
                 "success": False,
                 "error": str(e)
             }
 
-# Global instance
-mpesa_service = MPESAService()
+@lru_cache(maxsize=1)
+def get_mpesa_service() -> MPESAService:
+    """Process-wide MPESAService, built on first use.
+
+    Lazy construction keeps the token lock and cache off the import path
+    and gives routes an injectable Depends(get_mpesa_service) seam for
+    tests. The httpx client connects lazily, so module-level creation
+    never binds it to the wrong event loop.
+    """
+    return MPESAService()
@@ -1,15 +1,16 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, status, Depends
 from typing import Dict, Any
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
-import uuid
+import secrets
 
 from models.user import User
 from auth.jwt_handler import get_current_active_user
 from database.mongodb import get_collection, TRANSACTIONS_COLLECTION, WALLETS_COLLECTION
 from payments.paystack_service import paystack_service
-from payments.mpesa_service import mpesa_service
+from payments.mpesa_service import MPESAService, get_mpesa_service
 from config.settings import get_settings
 
 logger = logging.getLogger(__name__)
@@ -17,6 +18,10 @@ settings = get_settings()
 
 router = APIRouter()
 
+# A "verifying" claim older than this is considered abandoned (process
+# crashed between claim and settle) and may be re-claimed by a retry
+_VERIFY_CLAIM_TIMEOUT = timedelta(minutes=2)
+
 @router.post("/deposit/paystack")
 async def initiate_paystack_deposit(
     amount: float,
@@ -32,7 +37,7 @@ async def initiate_paystack_deposit(
             )
         
         # Generate unique reference
-        reference = f"DEP{datetime.utcnow().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}"
+        reference = f"DEP{datetime.utcnow():%Y%m%d}{secrets.token_hex(4).upper()}"
         
         # Initialize Paystack transaction
         result = await paystack_service.initialize_transaction(
@@ -79,7 +84,7 @@ async def initiate_paystack_deposit(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error initiating Paystack deposit: {e}")
+        logger.error("Error initiating Paystack deposit: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to initiate deposit"
@@ -89,7 +94,8 @@ async def initiate_paystack_deposit(
 async def initiate_mpesa_deposit(
     amount: float,
     phone_number: str,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    mpesa_service: MPESAService = Depends(get_mpesa_service)
 ):
     """Initiate an M-Pesa deposit."""
     try:
@@ -106,7 +112,7 @@ async def initiate_mpesa_deposit(
             )
         
         # Generate unique reference
-        reference = f"MPESA{datetime.utcnow().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}"
+        reference = f"MPESA{datetime.utcnow():%Y%m%d}{secrets.token_hex(4).upper()}"
         
         # Initiate M-Pesa STK push
         result = await mpesa_service.stk_push(
@@ -153,7 +159,7 @@ async def initiate_mpesa_deposit(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error initiating M-Pesa deposit: {e}")
+        logger.error("Error initiating M-Pesa deposit: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to initiate M-Pesa deposit"
@@ -164,7 +170,8 @@ async def initiate_mpesa_withdrawal(
     amount: float,
     phone_number: str,
     pin: str,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    mpesa_service: MPESAService = Depends(get_mpesa_service)
 ):
     """Initiate an M-Pesa withdrawal."""
     try:
@@ -187,34 +194,11 @@ async def initiate_mpesa_withdrawal(
                 detail="Maximum withdrawal amount is KES 70,000"
             )
         
-        # Check wallet balance
-        wallets_collection = await get_collection(WALLETS_COLLECTION)
-        wallet = await wallets_collection.find_one({"user_id": current_user.id})
-        
-        if not wallet or wallet.get("balance_kes", 0) < amount:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Insufficient wallet balance"
-            )
-        
         # Generate unique reference
-        reference = f"WTH{datetime.utcnow().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}"
-        
-        # Initiate M-Pesa B2C payment
-        result = await mpesa_service.b2c_payment(
-            phone_number=phone_number,
-            amount=amount,
-            reference=reference,
-            description="Wallet withdrawal"
-        )
-        
-        if not result["success"]:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=result["error"]
-            )
-        
-        # Create pending transaction record
+        reference = f"WTH{datetime.utcnow():%Y%m%d}{secrets.token_hex(4).upper()}"
+
+        # Record the intent before touching money - if anything below
+        # fails, the reversal path has a row to mark failed
         transaction = {
             "_id": ObjectId(),
             "user_id": current_user.id,
@@ -222,28 +206,80 @@ async def initiate_mpesa_withdrawal(
             "amount": amount,
             "currency": "KES",
             "reference": reference,
-            "status": "pending",
+            "status": "pending_debit",
             "gateway": "mpesa",
-            "gateway_ref": result["ConversationID"],
             "created_at": datetime.utcnow(),
             "metadata": {
-                "phone_number": phone_number,
-                "conversation_id": result["ConversationID"]
+                "phone_number": phone_number
             }
         }
-        
+
         transactions_collection = await get_collection(TRANSACTIONS_COLLECTION)
         await transactions_collection.insert_one(transaction)
-        
-        # Deduct amount from wallet (will be reversed if withdrawal fails)
-        await wallets_collection.update_one(
-            {"user_id": current_user.id},
+
+        # Balance check and debit fused into one atomic round-trip: the
+        # $gte guard means two concurrent withdrawals can't both pass a
+        # separate read-then-decrement and overdraw the wallet
+        wallets_collection = await get_collection(WALLETS_COLLECTION)
+        debited = await wallets_collection.find_one_and_update(
+            {"user_id": current_user.id, "balance_kes": {"$gte": amount}},
             {
                 "$inc": {"balance_kes": -amount},
                 "$set": {"updated_at": datetime.utcnow()}
             }
         )
-        
+        if debited is None:
+            await transactions_collection.update_one(
+                {"_id": transaction["_id"]},
+                {"$set": {"status": "failed", "failure_reason": "Insufficient wallet balance"}}
+            )
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient wallet balance"
+            )
+
+        # Initiate M-Pesa B2C payment
+        result = await mpesa_service.b2c_payment(
+            phone_number=phone_number,
+            amount=amount,
+            reference=reference,
+            description="Wallet withdrawal"
+        )
+
+        if not result["success"]:
+            # Reverse the debit and close out the transaction record -
+            # independent single-doc writes, so pipeline them concurrently
+            await asyncio.gather(
+                wallets_collection.update_one(
+                    {"user_id": current_user.id},
+                    {
+                        "$inc": {"balance_kes": amount},
+                        "$set": {"updated_at": datetime.utcnow()}
+                    }
+                ),
+                transactions_collection.update_one(
+                    {"_id": transaction["_id"], "status": "pending_debit"},
+                    {"$set": {"status": "failed", "failure_reason": result["error"]}}
+                )
+            )
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=result["error"]
+            )
+
+        # Debit held; attach the gateway reference and hand off to the
+        # callback for final settlement
+        await transactions_collection.update_one(
+            {"_id": transaction["_id"]},
+            {
+                "$set": {
+                    "status": "pending",
+                    "gateway_ref": result["ConversationID"],
+                    "metadata.conversation_id": result["ConversationID"]
+                }
+            }
+        )
+
         return {
             "success": True,
             "reference": reference,
@@ -254,7 +290,7 @@ async def initiate_mpesa_withdrawal(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error initiating M-Pesa withdrawal: {e}")
+        logger.error("Error initiating M-Pesa withdrawal: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to initiate withdrawal"
@@ -280,7 +316,7 @@ async def get_supported_banks():
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting banks: {e}")
+        logger.error("Error getting banks: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get banks"
@@ -293,43 +329,103 @@ async def verify_paystack_transaction(
 ):
     """Verify a Paystack transaction."""
     try:
-        # Verify with Paystack
-        result = await paystack_service.verify_transaction(reference)
-        
-        if not result["success"]:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=result["error"]
-            )
-        
-        # Update transaction status
+        # Claim the transaction locally BEFORE any outbound call: webhook
+        # retries and double-clicked verifies short-circuit on one cheap
+        # Mongo round-trip instead of re-paying the Paystack HTTPS call.
+        # Only the coroutine that wins the pending -> verifying flip may
+        # talk to the gateway and credit the wallet. Stale claims (a crash
+        # between claim and settle) become reclaimable after the timeout,
+        # so no row can stay stuck in "verifying" forever.
+        now = datetime.utcnow()
         transactions_collection = await get_collection(TRANSACTIONS_COLLECTION)
-        transaction = await transactions_collection.find_one({"reference": reference})
-        
-        if not transaction:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Transaction not found"
+        claimed = await transactions_collection.find_one_and_update(
+            {
+                "reference": reference,
+                "user_id": current_user.id,
+                "$or": [
+                    {"status": "pending"},
+                    {
+                        "status": "verifying",
+                        "verifying_at": {"$lt": now - _VERIFY_CLAIM_TIMEOUT}
+                    }
+                ]
+            },
+            {
+                "$set": {"status": "verifying", "verifying_at": now},
+                "$inc": {"verify_attempts": 1}
+            }
+        )
+
+        if claimed is None:
+            # Failure path only: one projected read to tell the cases apart
+            existing = await transactions_collection.find_one(
+                {"reference": reference},
+                {"user_id": 1, "status": 1, "amount_kes": 1}
             )
-        
-        if transaction["user_id"] != current_user.id:
+            if existing is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Transaction not found"
+                )
+            if existing["user_id"] != current_user.id:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Not authorized to verify this transaction"
+                )
+            if existing["status"] == "completed":
+                # Terminal: replay the stored outcome without calling
+                # Paystack again
+                return {
+                    "success": True,
+                    "message": "Deposit completed successfully",
+                    "amount_kes": existing.get("amount_kes"),
+                    "reference": reference
+                }
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not authorized to verify this transaction"
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Transaction verification already in progress"
             )
-        
-        # Update transaction
-        await transactions_collection.update_one(
-            {"reference": reference},
-            {
-                "$set": {
-                    "status": "completed",
-                    "completed_at": datetime.utcnow(),
-                    "gateway_ref": result["gateway_ref"]
+
+        try:
+            # Verify with Paystack
+            result = await paystack_service.verify_transaction(reference)
+
+            if not result["success"]:
+                # Release the claim so a later retry can attempt verification
+                await transactions_collection.update_one(
+                    {"_id": claimed["_id"], "status": "verifying"},
+                    {"$set": {"status": "pending"}}
+                )
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=result["error"]
+                )
+
+            # Settle: record the credited amount on the row so replayed
+            # verifies can serve it from Mongo
+            await transactions_collection.update_one(
+                {"_id": claimed["_id"], "status": "verifying"},
+                {
+                    "$set": {
+                        "status": "completed",
+                        "completed_at": datetime.utcnow(),
+                        "gateway_ref": result["gateway_ref"],
+                        "amount_kes": result["amount_kes"]
+                    }
                 }
-            }
-        )
-        
+            )
+        except HTTPException:
+            raise
+        except Exception:
+            # Anything unexpected between claim and settle must not strand
+            # the row in "verifying" - release the claim before the generic
+            # error handling below turns this into a 500
+            await transactions_collection.update_one(
+                {"_id": claimed["_id"], "status": "verifying"},
+                {"$set": {"status": "pending"}}
+            )
+            raise
+
         # Credit user's wallet
         wallets_collection = await get_collection(WALLETS_COLLECTION)
         await wallets_collection.update_one(
@@ -339,7 +435,7 @@ async def verify_paystack_transaction(
                 "$set": {"updated_at": datetime.utcnow()}
             }
         )
-        
+
         return {
             "success": True,
             "message": "Deposit completed successfully",
@@ -350,7 +446,7 @@ async def verify_paystack_transaction(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error verifying Paystack transaction: {e}")
+        logger.error("Error verifying Paystack transaction: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to verify transaction"
@@ -362,12 +458,12 @@ async def mpesa_callback(callback_data: Dict[str, Any]):
     try:
         # This would handle M-Pesa webhook callbacks
         # For now, just log the data
-        logger.info(f"M-Pesa callback received: {callback_data}")
+        logger.info("M-Pesa callback received: %s", callback_data)
         
         return {"success": True, "message": "Callback received"}
         
     except Exception as e:
-        logger.error(f"Error processing M-Pesa callback: {e}")
+        logger.error("Error processing M-Pesa callback: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to process callback"
@@ -1,5 +1,7 @@
+import asyncio
 import httpx
 import logging
+import time
 from typing import Optional, Dict, Any
 from datetime import datetime
 from config.settings import get_settings
@@ -7,27 +9,49 @@ from config.settings import get_settings
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+PAYSTACK_BASE_URL = "https://api.paystack.co"
+
+# One pooled client for all Paystack calls - keep-alive connections skip
+# the per-call DNS + TCP/TLS handshake to api.paystack.co, and HTTP/2
+# multiplexes concurrent payment requests over a single connection
+_http = httpx.AsyncClient(
+    base_url=PAYSTACK_BASE_URL,
+    # The secret never changes at runtime, so the Bearer header lives on
+    # the client - no per-call header dict or f-string. Content-Type is
+    # set automatically by json= requests.
+    headers={"Authorization": f"Bearer {settings.paystack_secret_key}"},
+    http2=True,
+    timeout=httpx.Timeout(10.0, connect=3.0),
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+)
+
+async def close_http_client():
+    """Close the shared Paystack HTTP client (call on app shutdown)."""
+    await _http.aclose()
+
 class PaystackService:
     def __init__(self):
         self.secret_key = settings.paystack_secret_key
         self.public_key = settings.paystack_public_key
-        self.base_url = "https://api.paystack.co"
-        
+        self.base_url = PAYSTACK_BASE_URL
+
         if not self.secret_key:
             logger.warning("Paystack secret key not configured")
+
+        # Bank-list cache: the list changes rarely, so one upstream fetch
+        # per TTL serves every /banks request. The lock collapses
+        # concurrent cold misses into a single Paystack round-trip.
+        self._banks_cache: Optional[Dict[str, Any]] = None
+        self._banks_cached_at = 0.0
+        self._banks_ttl = 86400.0  # 24h
+        self._banks_lock = asyncio.Lock()
     
     async def initialize_transaction(self, amount: float, email: str, reference: str, callback_url: str) -> Dict[str, Any]:
         """Initialize a Paystack transaction for deposit."""
         try:
             if not self.secret_key:
                 raise ValueError("Paystack not configured")
-            
-            url = f"{self.base_url}/transaction/initialize"
-            headers = {
-                "Authorization": f"Bearer {self.secret_key}",
-                "Content-Type": "application/json"
-            }
-            
+
             data = {
                 "amount": int(amount * 100),  # Convert to kobo (smallest currency unit)
                 "email": email,
@@ -40,23 +64,22 @@ class PaystackService:
                 }
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=data, headers=headers)
-                response.raise_for_status()
-                
-                result = response.json()
-                if result.get("status"):
-                    return {
-                        "success": True,
-                        "authorization_url": result["data"]["authorization_url"],
-                        "reference": result["data"]["reference"],
-                        "access_code": result["data"]["access_code"]
-                    }
-                else:
-                    raise Exception(f"Paystack error: {result.get('message', 'Unknown error')}")
+            response = await _http.post("/transaction/initialize", json=data)
+            response.raise_for_status()
+
+            result = response.json()
+            if result.get("status"):
+                return {
+                    "success": True,
+                    "authorization_url": result["data"]["authorization_url"],
+                    "reference": result["data"]["reference"],
+                    "access_code": result["data"]["access_code"]
+                }
+            else:
+                raise Exception(f"Paystack error: {result.get('message', 'Unknown error')}")
                     
         except Exception as e:
-            logger.error(f"Error initializing Paystack transaction: {e}")
+            logger.error("Error initializing Paystack transaction: %s", e)
             return {
                 "success": False,
                 "error": str(e)
@@ -67,41 +90,35 @@ class PaystackService:
         try:
             if not self.secret_key:
                 raise ValueError("Paystack not configured")
-            
-            url = f"{self.base_url}/transaction/verify/{reference}"
-            headers = {
-                "Authorization": f"Bearer {self.secret_key}"
-            }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                
-                result = response.json()
-                if result.get("status") and result["data"]["status"] == "success":
-                    # Convert from kobo to NGN, then to KES (approximate conversion)
-                    amount_ngn = result["data"]["amount"] / 100
-                    amount_kes = amount_ngn * 0.15  # Approximate NGN to KES rate
-                    
-                    return {
-                        "success": True,
-                        "amount_ngn": amount_ngn,
-                        "amount_kes": amount_kes,
-                        "reference": result["data"]["reference"],
-                        "gateway_ref": result["data"]["id"],
-                        "paid_at": result["data"]["paid_at"],
-                        "channel": result["data"]["channel"],
-                        "customer_email": result["data"]["customer"]["email"]
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": "Transaction not successful",
-                        "status": result["data"]["status"]
-                    }
+
+            response = await _http.get(f"/transaction/verify/{reference}")
+            response.raise_for_status()
+
+            result = response.json()
+            if result.get("status") and result["data"]["status"] == "success":
+                # Convert from kobo to NGN, then to KES (approximate conversion)
+                amount_ngn = result["data"]["amount"] / 100
+                amount_kes = amount_ngn * 0.15  # Approximate NGN to KES rate
+
+                return {
+                    "success": True,
+                    "amount_ngn": amount_ngn,
+                    "amount_kes": amount_kes,
+                    "reference": result["data"]["reference"],
+                    "gateway_ref": result["data"]["id"],
+                    "paid_at": result["data"]["paid_at"],
+                    "channel": result["data"]["channel"],
+                    "customer_email": result["data"]["customer"]["email"]
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": "Transaction not successful",
+                    "status": result["data"]["status"]
+                }
                     
         except Exception as e:
-            logger.error(f"Error verifying Paystack transaction: {e}")
+            logger.error("Error verifying Paystack transaction: %s", e)
             return {
                 "success": False,
                 "error": str(e)
@@ -112,13 +129,7 @@ class PaystackService:
         try:
             if not self.secret_key:
                 raise ValueError("Paystack not configured")
-            
-            url = f"{self.base_url}/transferrecipient"
-            headers = {
-                "Authorization": f"Bearer {self.secret_key}",
-                "Content-Type": "application/json"
-            }
-            
+
             data = {
                 "type": "nuban",
                 "name": account_name,
@@ -126,25 +137,24 @@ class PaystackService:
                 "bank_code": bank_code,
                 "currency": "NGN"
             }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=data, headers=headers)
-                response.raise_for_status()
-                
-                result = response.json()
-                if result.get("status"):
-                    return {
-                        "success": True,
-                        "recipient_code": result["data"]["recipient_code"],
-                        "account_number": result["data"]["details"]["account_number"],
-                        "account_name": result["data"]["details"]["account_name"],
-                        "bank_name": result["data"]["details"]["bank_name"]
-                    }
-                else:
-                    raise Exception(f"Paystack error: {result.get('message', 'Unknown error')}")
+
+            response = await _http.post("/transferrecipient", json=data)
+            response.raise_for_status()
+
+            result = response.json()
+            if result.get("status"):
+                return {
+                    "success": True,
+                    "recipient_code": result["data"]["recipient_code"],
+                    "account_number": result["data"]["details"]["account_number"],
+                    "account_name": result["data"]["details"]["account_name"],
+                    "bank_name": result["data"]["details"]["bank_name"]
+                }
+            else:
+                raise Exception(f"Paystack error: {result.get('message', 'Unknown error')}")
                     
         except Exception as e:
-            logger.error(f"Error creating Paystack recipient: {e}")
+            logger.error("Error creating Paystack recipient: %s", e)
             return {
                 "success": False,
                 "error": str(e)
@@ -155,13 +165,7 @@ class PaystackService:
         try:
             if not self.secret_key:
                 raise ValueError("Paystack not configured")
-            
-            url = f"{self.base_url}/transfer"
-            headers = {
-                "Authorization": f"Bearer {self.secret_key}",
-                "Content-Type": "application/json"
-            }
-            
+
             data = {
                 "source": "balance",
                 "amount": int(amount * 100),  # Convert to kobo
@@ -170,56 +174,68 @@ class PaystackService:
                 "reason": reason,
                 "currency": "NGN"
             }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=data, headers=headers)
-                response.raise_for_status()
-                
-                result = response.json()
-                if result.get("status"):
-                    return {
-                        "success": True,
-                        "transfer_code": result["data"]["transfer_code"],
-                        "reference": result["data"]["reference"],
-                        "amount": result["data"]["amount"] / 100,
-                        "status": result["data"]["status"]
-                    }
-                else:
-                    raise Exception(f"Paystack error: {result.get('message', 'Unknown error')}")
+
+            response = await _http.post("/transfer", json=data)
+            response.raise_for_status()
+
+            result = response.json()
+            if result.get("status"):
+                return {
+                    "success": True,
+                    "transfer_code": result["data"]["transfer_code"],
+                    "reference": result["data"]["reference"],
+                    "amount": result["data"]["amount"] / 100,
+                    "status": result["data"]["status"]
+                }
+            else:
+                raise Exception(f"Paystack error: {result.get('message', 'Unknown error')}")
                     
         except Exception as e:
-            logger.error(f"Error initiating Paystack transfer: {e}")
+            logger.error("Error initiating Paystack transfer: %s", e)
             return {
                 "success": False,
                 "error": str(e)
             }
     
+    def _banks_cache_fresh(self) -> bool:
+        return (
+            self._banks_cache is not None
+            and time.monotonic() - self._banks_cached_at < self._banks_ttl
+        )
+
     async def get_banks(self) -> Dict[str, Any]:
-        """Get list of supported banks."""
+        """Get list of supported banks (cached in-process for 24h)."""
+        # Fast path: warm cache needs no lock and no network
+        if self._banks_cache_fresh():
+            return self._banks_cache
+
         try:
             if not self.secret_key:
                 raise ValueError("Paystack not configured")
-            
-            url = f"{self.base_url}/bank"
-            headers = {
-                "Authorization": f"Bearer {self.secret_key}"
-            }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers)
+
+            async with self._banks_lock:
+                # Re-check under the lock - a concurrent miss may have
+                # already refreshed while we waited
+                if self._banks_cache_fresh():
+                    return self._banks_cache
+
+
+                response = await _http.get("/bank")
                 response.raise_for_status()
-                
+
                 result = response.json()
                 if result.get("status"):
-                    return {
+                    self._banks_cache = {
                         "success": True,
                         "banks": result["data"]
                     }
+                    self._banks_cached_at = time.monotonic()
+                    return self._banks_cache
                 else:
                     raise Exception(f"Paystack error: {result.get('message', 'Unknown error')}")
                     
         except Exception as e:
-            logger.error(f"Error getting banks from Paystack: {e}")
+            logger.error("Error getting banks from Paystack: %s", e)
             return {
                 "success": False,
                 "error": str(e)
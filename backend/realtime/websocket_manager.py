@@ -1,6 +1,6 @@
 import asyncio
-import json
 import logging
+import orjson
 from typing import Dict, Set, Any, Optional
 from fastapi import WebSocket, WebSocketDisconnect
 from datetime import datetime
@@ -14,6 +14,9 @@ class ConnectionManager:
         self.active_connections: Dict[str, Set[WebSocket]] = {}
         # Store connection metadata
         self.connection_metadata: Dict[WebSocket, Dict[str, Any]] = {}
+        # Secondary index by connection type - broadcast_to_type reads this
+        # directly instead of scanning all metadata
+        self._by_type: Dict[str, Set[WebSocket]] = {}
         
     async def connect(self, websocket: WebSocket, user_id: str, connection_type: str = "general"):
         """Accept a new WebSocket connection."""
@@ -31,6 +34,7 @@ class ConnectionManager:
             "connected_at": datetime.utcnow(),
             "connection_id": str(uuid.uuid4())
         }
+        self._by_type.setdefault(connection_type, set()).add(websocket)
         
         logger.info(f"User {user_id} connected via {connection_type} WebSocket")
         
@@ -44,26 +48,31 @@ class ConnectionManager:
     
     def disconnect(self, websocket: WebSocket):
         """Remove a WebSocket connection."""
-        user_id = None
-        for uid, connections in self.active_connections.items():
-            if websocket in connections:
-                connections.remove(websocket)
-                user_id = uid
-                break
-        
-        if user_id and not self.active_connections[user_id]:
-            del self.active_connections[user_id]
-        
-        if websocket in self.connection_metadata:
-            del self.connection_metadata[websocket]
-        
-        if user_id:
-            logger.info(f"User {user_id} disconnected from WebSocket")
+        # Metadata already records the owner - no need to scan every
+        # user's connection set looking for this socket
+        metadata = self.connection_metadata.pop(websocket, None)
+        if metadata is None:
+            return
+
+        user_id = metadata["user_id"]
+        connections = self.active_connections.get(user_id)
+        if connections is not None:
+            connections.discard(websocket)
+            if not connections:
+                del self.active_connections[user_id]
+
+        by_type = self._by_type.get(metadata["connection_type"])
+        if by_type is not None:
+            by_type.discard(websocket)
+            if not by_type:
+                del self._by_type[metadata["connection_type"]]
+
+        logger.info(f"User {user_id} disconnected from WebSocket")
     
     async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
         """Send a message to a specific WebSocket connection."""
         try:
-            await websocket.send_text(json.dumps(message))
+            await websocket.send_bytes(orjson.dumps(message))
         except Exception as e:
             logger.error(f"Error sending personal message: {e}")
             self.disconnect(websocket)
@@ -71,17 +80,18 @@ class ConnectionManager:
     async def broadcast_to_user(self, user_id: str, message: Dict[str, Any]):
         """Broadcast a message to all connections of a specific user."""
         if user_id in self.active_connections:
-            disconnected = set()
-            for websocket in self.active_connections[user_id]:
-                try:
-                    await websocket.send_text(json.dumps(message))
-                except Exception as e:
-                    logger.error(f"Error broadcasting to user {user_id}: {e}")
-                    disconnected.add(websocket)
-            
-            # Clean up disconnected websockets
-            for websocket in disconnected:
-                self.disconnect(websocket)
+            # Serialize once for the whole fan-out instead of once per socket
+            payload = orjson.dumps(message)
+            sockets = list(self.active_connections[user_id])
+            # Concurrent sends: one slow client no longer stalls the rest
+            results = await asyncio.gather(
+                *(ws.send_bytes(payload) for ws in sockets),
+                return_exceptions=True
+            )
+            for websocket, result in zip(sockets, results):
+                if isinstance(result, Exception):
+                    logger.error("Error broadcasting to user %s: %s", user_id, result)
+                    self.disconnect(websocket)
     
     async def broadcast_to_all(self, message: Dict[str, Any]):
         """Broadcast a message to all connected users."""
@@ -89,36 +99,34 @@ class ConnectionManager:
         for connections in self.active_connections.values():
             all_websockets.update(connections)
         
-        disconnected = set()
-        for websocket in all_websockets:
-            try:
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error broadcasting to all: {e}")
-                disconnected.add(websocket)
-        
-        # Clean up disconnected websockets
-        for websocket in disconnected:
-            self.disconnect(websocket)
+        # One serialization shared by every socket - broadcast CPU no
+        # longer scales with connection count
+        payload = orjson.dumps(message)
+        sockets = list(all_websockets)
+        results = await asyncio.gather(
+            *(ws.send_bytes(payload) for ws in sockets),
+            return_exceptions=True
+        )
+        for websocket, result in zip(sockets, results):
+            if isinstance(result, Exception):
+                logger.error("Error broadcasting to all: %s", result)
+                self.disconnect(websocket)
     
     async def broadcast_to_type(self, connection_type: str, message: Dict[str, Any]):
         """Broadcast a message to all connections of a specific type."""
-        target_websockets = set()
-        for websocket, metadata in self.connection_metadata.items():
-            if metadata.get("connection_type") == connection_type:
-                target_websockets.add(websocket)
-        
-        disconnected = set()
-        for websocket in target_websockets:
-            try:
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error broadcasting to type {connection_type}: {e}")
-                disconnected.add(websocket)
-        
-        # Clean up disconnected websockets
-        for websocket in disconnected:
-            self.disconnect(websocket)
+        sockets = list(self._by_type.get(connection_type, ()))
+        if not sockets:
+            return
+
+        payload = orjson.dumps(message)
+        results = await asyncio.gather(
+            *(ws.send_bytes(payload) for ws in sockets),
+            return_exceptions=True
+        )
+        for websocket, result in zip(sockets, results):
+            if isinstance(result, Exception):
+                logger.error("Error broadcasting to type %s: %s", connection_type, result)
+                self.disconnect(websocket)
     
     def get_user_connections(self, user_id: str) -> Set[WebSocket]:
         """Get all active connections for a user."""
@@ -145,33 +153,41 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 class WebSocketMessage:
-    """Helper class for creating standardized WebSocket messages."""
+    """Helper class for creating standardized WebSocket messages.
+
+    Each helper accepts an optional precomputed ``timestamp`` so callers
+    fanning the same event out to many users pay for utcnow().isoformat()
+    once per batch rather than once per message.
+    """
     
     @staticmethod
-    def balance_update(user_id: str, balance_kes: float, balance_usdt: float):
+    def balance_update(user_id: str, balance_kes: float, balance_usdt: float,
+                       timestamp: Optional[str] = None):
         return {
             "type": "balance_update",
             "user_id": user_id,
             "data": {
                 "balance_kes": balance_kes,
                 "balance_usdt": balance_usdt,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": timestamp or datetime.utcnow().isoformat()
             }
         }
     
     @staticmethod
-    def transaction_notification(user_id: str, transaction: Dict[str, Any]):
+    def transaction_notification(user_id: str, transaction: Dict[str, Any],
+                                 timestamp: Optional[str] = None):
         return {
             "type": "transaction_notification",
             "user_id": user_id,
             "data": {
                 "transaction": transaction,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": timestamp or datetime.utcnow().isoformat()
             }
         }
     
     @staticmethod
-    def bot_status_update(user_id: str, bot_id: str, status: str, performance: Dict[str, Any]):
+    def bot_status_update(user_id: str, bot_id: str, status: str, performance: Dict[str, Any],
+                          timestamp: Optional[str] = None):
         return {
             "type": "bot_status_update",
             "user_id": user_id,
@@ -179,30 +195,32 @@ class WebSocketMessage:
                 "bot_id": bot_id,
                 "status": status,
                 "performance": performance,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": timestamp or datetime.utcnow().isoformat()
             }
         }
     
     @staticmethod
-    def system_notification(user_id: str, message: str, level: str = "info"):
+    def system_notification(user_id: str, message: str, level: str = "info",
+                            timestamp: Optional[str] = None):
         return {
             "type": "system_notification",
             "user_id": user_id,
             "data": {
                 "message": message,
                 "level": level,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": timestamp or datetime.utcnow().isoformat()
             }
         }
     
     @staticmethod
-    def error_notification(user_id: str, error: str, details: Optional[Dict[str, Any]] = None):
+    def error_notification(user_id: str, error: str, details: Optional[Dict[str, Any]] = None,
+                           timestamp: Optional[str] = None):
         return {
             "type": "error_notification",
             "user_id": user_id,
             "data": {
                 "error": error,
                 "details": details,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": timestamp or datetime.utcnow().isoformat()
             }
         }
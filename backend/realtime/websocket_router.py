@@ -1,9 +1,12 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, status
 from typing import Optional
 import logging
-import json
+import orjson
 from datetime import datetime
 
+from bson import ObjectId
+from bson.errors import InvalidId
+
 from realtime.websocket_manager import manager, WebSocketMessage
 from auth.jwt_handler import get_current_user_from_token
 from database.mongodb import get_collection, WALLETS_COLLECTION, TRANSACTIONS_COLLECTION
@@ -63,7 +66,7 @@ async def wallet_websocket(websocket: WebSocket, user_id: str):
                 try:
                     # Wait for messages from client
                     data = await websocket.receive_text()
-                    message = json.loads(data)
+                    message = orjson.loads(data)
                     
                     # Handle different message types
                     if message.get("type") == "ping":
@@ -137,19 +140,40 @@ async def bots_websocket(websocket: WebSocket, user_id: str):
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
         
+        # bots.user_id is stored as a BSON ObjectId - the string path
+        # parameter would silently match nothing
+        try:
+            owner_id = ObjectId(user_id)
+        except InvalidId:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
         # Connect to WebSocket manager
         await manager.connect(websocket, user_id, "bots")
-        
+
         try:
-            # Send initial bot status
+            # Send initial bot status, projected to the serializable
+            # response shape (raw docs carry ObjectIds)
             bots_collection = await get_collection("bots")
-            bots = await bots_collection.find({"user_id": user_id}).to_list(length=50)
-            
+            bots = await bots_collection.find(
+                {"user_id": owner_id},
+                projection={"name": 1, "strategy": 1, "status": 1, "created_at": 1}
+            ).to_list(length=50)
+
             if bots:
                 initial_message = {
                     "type": "bot_status_initial",
                     "data": {
-                        "bots": bots,
+                        "bots": [
+                            {
+                                "id": str(bot["_id"]),
+                                "name": bot["name"],
+                                "strategy": bot["strategy"],
+                                "status": bot["status"],
+                                "created_at": bot["created_at"]
+                            }
+                            for bot in bots
+                        ],
                         "timestamp": datetime.utcnow().isoformat()
                     }
                 }
@@ -160,7 +184,7 @@ async def bots_websocket(websocket: WebSocket, user_id: str):
                 try:
                     # Wait for messages from client
                     data = await websocket.receive_text()
-                    message = json.loads(data)
+                    message = orjson.loads(data)
                     
                     # Handle different message types
                     if message.get("type") == "ping":
@@ -230,7 +254,7 @@ async def notifications_websocket(websocket: WebSocket, user_id: str):
                 try:
                     # Wait for ping messages
                     data = await websocket.receive_text()
-                    message = json.loads(data)
+                    message = orjson.loads(data)
                     
                     if message.get("type") == "ping":
                         await manager.send_personal_message({
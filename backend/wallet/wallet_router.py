@@ -1,13 +1,15 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from typing import List, Optional
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from bson import ObjectId
 import uuid
 
 from models.wallet import (
-    WalletResponse, TransactionResponse, TransferRequest, 
-    BankTransferRequest, P2PTransferRequest, TransferResponse
+    WalletResponse, TransactionResponse, TransferRequest,
+    BankTransferRequest, P2PTransferRequest, TransferResponse,
+    TRANSACTION_RESPONSE_PROJECTION
 )
 from models.user import User
 from auth.jwt_handler import get_current_active_user
@@ -46,11 +48,20 @@ async def get_wallet_balance(current_user: User = Depends(get_current_active_use
             await wallets_collection.insert_one(new_wallet)
             wallet = new_wallet
         
-        # Convert to response model
-        wallet["id"] = str(wallet["_id"])
-        del wallet["_id"]
-        
-        return WalletResponse(**wallet)
+        # model_construct skips Pydantic validation - the doc is our own
+        # write, and FastAPI validates once more against response_model
+        # anyway, so validating here would double the cost
+        return WalletResponse.model_construct(
+            id=str(wallet["_id"]),
+            balance_kes=wallet.get("balance_kes", 0.0),
+            balance_usdt=wallet.get("balance_usdt", 0.0),
+            total_received=wallet.get("total_received", 0.0),
+            total_sent=wallet.get("total_sent", 0.0),
+            total_fees=wallet.get("total_fees", 0.0),
+            daily_transfer_count=wallet.get("daily_transfer_count", 0),
+            daily_transfer_amount=wallet.get("daily_transfer_amount", 0.0),
+            last_transfer_date=wallet.get("last_transfer_date"),
+        )
         
     except Exception as e:
         logger.error(f"Error getting wallet balance: {e}")
@@ -69,16 +80,35 @@ async def get_transactions(
     try:
         transactions_collection = await get_collection(TRANSACTIONS_COLLECTION)
         
-        # Get transactions for current user
-        cursor = transactions_collection.find({"user_id": current_user.id})
+        # Get transactions for current user - projected to the response
+        # fields so Mongo doesn't ship bytes the page won't return
+        cursor = transactions_collection.find(
+            {"user_id": current_user.id},
+            projection=TRANSACTION_RESPONSE_PROJECTION
+        )
         cursor = cursor.sort("created_at", -1).skip(offset).limit(limit)
         
+        # Same trusted-data shortcut as above: skip the in-route validation
+        # pass on docs we wrote ourselves
         transactions = []
         async for transaction in cursor:
-            transaction["id"] = str(transaction["_id"])
-            del transaction["_id"]
-            transactions.append(TransactionResponse(**transaction))
-        
+            transactions.append(TransactionResponse.model_construct(
+                id=str(transaction["_id"]),
+                transaction_type=transaction["transaction_type"],
+                amount=transaction["amount"],
+                currency=transaction["currency"],
+                recipient_phone=transaction.get("recipient_phone"),
+                recipient_bank=transaction.get("recipient_bank"),
+                recipient_account=transaction.get("recipient_account"),
+                description=transaction.get("description"),
+                fee=transaction["fee"],
+                total_amount=transaction["total_amount"],
+                status=transaction["status"],
+                reference=transaction["reference"],
+                created_at=transaction["created_at"],
+                completed_at=transaction.get("completed_at"),
+            ))
+
         return transactions
         
     except Exception as e:
@@ -109,9 +139,13 @@ async def p2p_transfer(
                 detail="Daily transfer limit exceeded"
             )
         
-        # Calculate fee (0.5% for P2P)
-        fee = transfer_data.amount * 0.005
-        total_amount = transfer_data.amount + fee
+        # Calculate fee (0.5% for P2P). Arithmetic runs in integer cents:
+        # float percentages drift (e.g. 0.1+0.2 style), and any drift here
+        # would be $inc'ed straight into the stored ledger
+        amount_cents = round(transfer_data.amount * 100)
+        fee_cents = round(amount_cents * 0.005)
+        fee = fee_cents / 100
+        total_amount = (amount_cents + fee_cents) / 100
         
         # Check if user has sufficient balance
         if not await _check_sufficient_balance(current_user.id, total_amount):
@@ -140,18 +174,22 @@ async def p2p_transfer(
             "completed_at": datetime.utcnow()
         }
         
-        # Insert transaction
+        # The transaction _id is generated client-side, so the record insert
+        # and the wallet debit have no ordering dependency - run them in
+        # flight together instead of paying two sequential round trips
         transactions_collection = await get_collection(TRANSACTIONS_COLLECTION)
-        await transactions_collection.insert_one(transaction)
-        
-        # Update wallet balance
-        await _update_wallet_balance(
-            current_user.id, 
-            -total_amount, 
-            fee, 
-            transfer_data.amount
+        await asyncio.gather(
+            transactions_collection.insert_one(transaction),
+            _apply_wallet_delta(
+                current_user.id,
+                balance_kes=-total_amount,
+                total_sent=total_amount,
+                total_fees=fee,
+                daily_transfer_count=1,
+                daily_transfer_amount=transfer_data.amount
+            )
         )
-        
+
         # Check if recipient exists and credit their wallet
         recipient_user = await _find_user_by_phone(transfer_data.recipient_phone)
         if recipient_user:
@@ -250,9 +288,12 @@ async def bank_transfer(
                 detail="Daily transfer limit exceeded"
             )
         
-        # Calculate fee (1% for bank transfers)
-        fee = transfer_data.amount * 0.01
-        total_amount = transfer_data.amount + fee
+        # Calculate fee (1% for bank transfers) - integer-cent arithmetic,
+        # same reasoning as the P2P path
+        amount_cents = round(transfer_data.amount * 100)
+        fee_cents = round(amount_cents * 0.01)
+        fee = fee_cents / 100
+        total_amount = (amount_cents + fee_cents) / 100
         
         # Check if user has sufficient balance
         if not await _check_sufficient_balance(current_user.id, total_amount):
@@ -281,18 +322,21 @@ async def bank_transfer(
             "created_at": datetime.utcnow()
         }
         
-        # Insert transaction
+        # Same concurrency as the P2P path: record insert and wallet debit
+        # are independent writes
         transactions_collection = await get_collection(TRANSACTIONS_COLLECTION)
-        await transactions_collection.insert_one(transaction)
-        
-        # Update wallet balance
-        await _update_wallet_balance(
-            current_user.id, 
-            -total_amount, 
-            fee, 
-            transfer_data.amount
+        await asyncio.gather(
+            transactions_collection.insert_one(transaction),
+            _apply_wallet_delta(
+                current_user.id,
+                balance_kes=-total_amount,
+                total_sent=total_amount,
+                total_fees=fee,
+                daily_transfer_count=1,
+                daily_transfer_amount=transfer_data.amount
+            )
         )
-        
+
         return TransferResponse(
             transaction_id=transaction_id,
             reference=reference,
@@ -381,34 +425,32 @@ async def _check_sufficient_balance(user_id: str, amount: float) -> bool:
         logger.error(f"Error checking balance: {e}")
         return False
 
-async def _update_wallet_balance(user_id: str, amount_change: float, fee: float, transfer_amount: float):
-    """Update user's wallet balance and transfer statistics."""
+async def _apply_wallet_delta(user_id: str, **deltas: float):
+    """Apply balance and stat changes as one atomic wallet update.
+
+    Keyword arguments name the wallet fields to $inc; zero deltas are
+    dropped so the server-side update stays minimal. Everything for a
+    transfer lands in a single round trip with no read-modify-write.
+    """
     try:
         wallets_collection = await get_collection(WALLETS_COLLECTION)
-        
+
+        now = datetime.utcnow()
         update_data = {
-            "$inc": {
-                "balance_kes": amount_change,
-                "total_fees": fee,
-                "daily_transfer_count": 1,
-                "daily_transfer_amount": transfer_amount
-            },
             "$set": {
-                "last_transfer_date": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
+                "last_transfer_date": now,
+                "updated_at": now
             }
         }
-        
-        if amount_change < 0:
-            update_data["$inc"]["total_sent"] = abs(amount_change)
-        else:
-            update_data["$inc"]["total_received"] = amount_change
-        
+        inc = {field: delta for field, delta in deltas.items() if delta}
+        if inc:
+            update_data["$inc"] = inc
+
         await wallets_collection.update_one(
             {"user_id": user_id},
             update_data
         )
-        
+
     except Exception as e:
         logger.error(f"Error updating wallet balance: {e}")
         raise
@@ -425,9 +467,6 @@ async def _find_user_by_phone(phone_number: str):
 async def _credit_recipient_wallet(user_id: str, amount: float, reference: str):
     """Credit recipient's wallet for P2P transfers."""
     try:
-        # Update recipient's wallet balance
-        await _update_wallet_balance(user_id, amount, 0.0, 0.0)
-        
         # Create transaction record for recipient
         transaction = {
             "_id": ObjectId(),
@@ -444,9 +483,14 @@ async def _credit_recipient_wallet(user_id: str, amount: float, reference: str):
             "completed_at": datetime.utcnow()
         }
         
+        # Credit and record concurrently. Receiving money does not consume
+        # the recipient's own daily transfer allowance
         transactions_collection = await get_collection(TRANSACTIONS_COLLECTION)
-        await transactions_collection.insert_one(transaction)
-        
+        await asyncio.gather(
+            _apply_wallet_delta(user_id, balance_kes=amount, total_received=amount),
+            transactions_collection.insert_one(transaction)
+        )
+
     except Exception as e:
         logger.error(f"Error crediting recipient wallet: {e}")
         # Don't raise here as the sender's transaction is already completed